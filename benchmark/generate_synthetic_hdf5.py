@@ -0,0 +1,244 @@
+"""
+生成用于性能测试的合成 bi-Piper HDF5 文件
+
+文件结构与 process_data 读取的录制数据一致：每个 episode 一个 group，包含
+- action、state：(T, 14) float32
+- image_left、image_mid、image_right：变长 uint8 dataset，每帧一张 JPEG
+- attrs：length（帧数）和 instruction（任务描述）
+
+图像为带移动色块和噪声的渐变画面，JPEG 压缩率与真实相机画面接近；
+每个相机预先编码 unique_frames 张不同的 JPEG 并循环使用，避免生成数据本身成为瓶颈
+"""
+
+import argparse
+from pathlib import Path
+from typing import List, Tuple
+
+import cv2
+import h5py
+import numpy as np
+
+
+CAMERA_DATASETS = ("image_left", "image_mid", "image_right")
+STATE_DIM = 14
+
+
+def parse_resolution(value: str) -> Tuple[int, int]:
+    """解析 HEIGHTxWIDTH 形式的分辨率"""
+    try:
+        height, width = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid resolution '{value}', expected HEIGHTxWIDTH")
+    if height <= 0 or width <= 0:
+        raise argparse.ArgumentTypeError(f"Invalid resolution '{value}', expected HEIGHTxWIDTH")
+    return height, width
+
+
+def synthetic_frame(height: int, width: int, frame_index: int, camera_index: int, rng: np.random.Generator) -> np.ndarray:
+    """生成一帧 BGR 图像：随相机变化的渐变背景、随时间移动的色块和少量噪声"""
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    phase = frame_index * 4 + camera_index * 60
+    frame = np.empty((height, width, 3), dtype=np.float32)
+    frame[..., 0] = (x + phase) % 256
+    frame[..., 1] = (y + 0.5 * x + camera_index * 80) % 256
+    frame[..., 2] = (255 - y + phase * 0.5) % 256
+
+    size = max(8, min(height, width) // 6)
+    top = int((height - size) * (0.5 + 0.4 * np.sin(frame_index / 15 + camera_index)))
+    left = int((width - size) * (0.5 + 0.4 * np.cos(frame_index / 20 + camera_index)))
+    frame[top : top + size, left : left + size] = (40 + 70 * camera_index, 200, 90)
+
+    frame += rng.normal(0, 6, frame.shape).astype(np.float32)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def encode_jpeg_pool(
+    height: int, width: int, camera_index: int, unique_frames: int, jpeg_quality: int, rng: np.random.Generator
+) -> List[np.ndarray]:
+    """为一个相机预先编码 unique_frames 张 JPEG"""
+    pool = []
+    for frame_index in range(unique_frames):
+        image = synthetic_frame(height, width, frame_index, camera_index, rng)
+        ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+        if not ok:
+            raise RuntimeError("JPEG encoding failed")
+        pool.append(encoded.reshape(-1))
+    return pool
+
+
+def write_episode(
+    group: h5py.Group,
+    length: int,
+    jpeg_pools: List[List[np.ndarray]],
+    instruction: str,
+    chunk_frames: int,
+    rng: np.random.Generator,
+):
+    """写入一个 episode 的 action / state / 相机数据和属性"""
+    # 关节轨迹为平滑的正弦曲线，state 滞后于 action
+    t = np.arange(length + 1, dtype=np.float32)[:, None]
+    joints = np.arange(STATE_DIM, dtype=np.float32)[None, :]
+    trajectory = np.sin(t / 30 + joints) * 0.5 + rng.normal(0, 0.01, (length + 1, STATE_DIM)).astype(np.float32)
+    group.create_dataset("action", data=trajectory[1:].astype(np.float32))
+    group.create_dataset("state", data=trajectory[:-1].astype(np.float32))
+
+    offset = int(rng.integers(0, len(jpeg_pools[0])))
+    for camera, pool in zip(CAMERA_DATASETS, jpeg_pools):
+        dataset = group.create_dataset(
+            camera,
+            shape=(length,),
+            dtype=h5py.vlen_dtype(np.uint8),
+            chunks=(min(chunk_frames, length),),
+        )
+        frames = np.empty(length, dtype=object)
+        for frame_index in range(length):
+            frames[frame_index] = pool[(offset + frame_index) % len(pool)]
+        dataset[:] = frames
+
+    group.attrs["length"] = length
+    group.attrs["instruction"] = instruction
+
+
+def generate(
+    output_dir: Path,
+    num_files: int = 2,
+    episodes_per_file: int = 5,
+    episode_length: int = 300,
+    length_jitter: float = 0.2,
+    resolution: Tuple[int, int] = (480, 640),
+    jpeg_quality: int = 90,
+    unique_frames: int = 60,
+    chunk_frames: int = 32,
+    instruction: str = "pick up the object and place it in the box",
+    seed: int = 0,
+) -> dict:
+    """
+    生成 num_files 个 HDF5 文件，每个包含 episodes_per_file 个 episode
+    episode 长度在 episode_length * (1 ± length_jitter) 内均匀分布，便于体现负载均衡的效果
+
+    Returns:
+        生成数据的统计：文件、episodes、帧数和字节数
+    """
+    rng = np.random.default_rng(seed)
+    height, width = resolution
+    output_dir.mkdir(parents=True, exist_ok=True)
+    jpeg_pools = [
+        encode_jpeg_pool(height, width, camera_index, unique_frames, jpeg_quality, rng)
+        for camera_index in range(len(CAMERA_DATASETS))
+    ]
+
+    files = []
+    total_episodes = 0
+    total_frames = 0
+    for file_index in range(num_files):
+        path = output_dir / f"synthetic_{file_index:03d}.hdf5"
+        with h5py.File(path, "w") as f:
+            for episode_index in range(episodes_per_file):
+                jitter = rng.uniform(-length_jitter, length_jitter)
+                length = max(1, int(round(episode_length * (1 + jitter))))
+                write_episode(
+                    f.create_group(f"episode_{episode_index}"), length, jpeg_pools, instruction, chunk_frames, rng
+                )
+                total_episodes += 1
+                total_frames += length
+        files.append(str(path))
+
+    return {
+        "files": files,
+        "episodes": total_episodes,
+        "frames": total_frames,
+        "bytes": sum(Path(path).stat().st_size for path in files),
+        "resolution": [height, width],
+        "jpeg_quality": jpeg_quality,
+        "seed": seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成用于性能测试的合成 bi-Piper HDF5 文件")
+
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        required=True,
+        help="Directory to write the synthetic HDF5 files to",
+    )
+    parser.add_argument(
+        "--num-files",
+        type=int,
+        default=2,
+        help="Number of HDF5 files",
+    )
+    parser.add_argument(
+        "--episodes-per-file",
+        type=int,
+        default=5,
+        help="Episodes per HDF5 file",
+    )
+    parser.add_argument(
+        "--episode-length",
+        type=int,
+        default=300,
+        help="Mean number of frames per episode",
+    )
+    parser.add_argument(
+        "--length-jitter",
+        type=float,
+        default=0.2,
+        help="Episode lengths are drawn uniformly from episode-length * (1 +/- jitter)",
+    )
+    parser.add_argument(
+        "--resolution",
+        type=parse_resolution,
+        default=(480, 640),
+        help="Camera resolution as HEIGHTxWIDTH",
+    )
+    parser.add_argument(
+        "--jpeg-quality",
+        type=int,
+        default=90,
+        help="JPEG quality of the camera frames",
+    )
+    parser.add_argument(
+        "--unique-frames",
+        type=int,
+        default=60,
+        help="Distinct JPEG frames encoded per camera and cycled through every episode",
+    )
+    parser.add_argument(
+        "--chunk-frames",
+        type=int,
+        default=32,
+        help="HDF5 chunk length of the camera datasets",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Random seed, the same seed produces the same files",
+    )
+
+    args = parser.parse_args()
+
+    summary = generate(
+        args.output_dir,
+        num_files=args.num_files,
+        episodes_per_file=args.episodes_per_file,
+        episode_length=args.episode_length,
+        length_jitter=args.length_jitter,
+        resolution=args.resolution,
+        jpeg_quality=args.jpeg_quality,
+        unique_frames=args.unique_frames,
+        chunk_frames=args.chunk_frames,
+        seed=args.seed,
+    )
+    print(
+        f"Generated {len(summary['files'])} files, {summary['episodes']} episodes, {summary['frames']} frames, "
+        f"{summary['bytes'] / 1024 / 1024:.1f} MB in {args.output_dir}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,361 @@
+"""
+在合成数据上测量各转换工具的吞吐，并把结果追加到结果文件中，便于在不同提交之间比较
+
+依次运行（均以子进程方式调用命令行，与实际使用一致）：
+- repack：convert_parallel/repack_hdf5.py repack
+- hdf2lerobotv21：单进程转换
+- convert_hdf5_shards：本地多进程转换，依次使用 --workers 指定的每个 worker 数
+- v30_to_v21：对 hdf2lerobotv21 的输出运行 convert_parallel/lerobot_v30_to_v21.py
+
+每个步骤记录耗时、帧率（episode 帧数 / 秒）和吞吐（输入字节数 / 秒），
+结果以一行 JSON 追加到 --output，并与结果文件中配置相同的上一条记录比较
+"""
+
+import argparse
+import json
+import os
+import platform
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import h5py
+
+from generate_synthetic_hdf5 import generate, parse_resolution
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+STEPS = ("repack", "hdf2lerobotv21", "convert_hdf5_shards", "v30_to_v21")
+BENCHMARK_REPO_ID = "benchmark/hdf2lerobotv21"
+
+
+def dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+def git_commit() -> Optional[str]:
+    """当前提交，工作区有未提交修改时追加 -dirty"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def run_step(name: str, cmd: List[str], env: dict, frames: int, nbytes: int, log_path: Path, **extra) -> dict:
+    """运行一个步骤并计时，命令输出写入 log_path"""
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    print(f"[{name}] {' '.join(shlex.quote(part) for part in cmd)}", flush=True)
+    with open(log_path, "w") as log:
+        start = time.perf_counter()
+        returncode = subprocess.run(cmd, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT).returncode
+        seconds = time.perf_counter() - start
+
+    result = {"step": name, **extra, "seconds": seconds, "frames": frames, "bytes": nbytes}
+    if returncode != 0:
+        result["status"] = "failed"
+        print(f"[{name}] failed with exit code {returncode}, see {log_path}")
+        tail = log_path.read_text(errors="replace").splitlines()[-10:]
+        for line in tail:
+            print(f"    {line}")
+    else:
+        result["status"] = "ok"
+        result["frames_per_s"] = frames / seconds
+        result["mb_per_s"] = nbytes / 1024 / 1024 / seconds
+    return result
+
+
+def step_key(result: dict) -> tuple:
+    return result["step"], result.get("workers")
+
+
+def load_previous(output: Path, config: dict) -> Optional[dict]:
+    """结果文件中配置相同的最后一条记录"""
+    if not output.exists():
+        return None
+    previous = None
+    with open(output) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("config") == config:
+                previous = record
+    return previous
+
+
+def format_results(results: List[dict], previous: Optional[dict]) -> List[str]:
+    previous_results = {step_key(result): result for result in (previous or {}).get("results", [])}
+    header = f"{'step':<22} {'workers':>7} {'seconds':>9} {'frames/s':>10} {'MB/s':>8}"
+    if previous is not None:
+        header += f" {'vs ' + str(previous.get('commit')):>16}"
+    lines = [header]
+    for result in results:
+        workers = result.get("workers") if result.get("workers") is not None else "-"
+        if result["status"] != "ok":
+            lines.append(f"{result['step']:<22} {workers:>7} {result['seconds']:>9.2f} {'failed':>10}")
+            continue
+        line = (
+            f"{result['step']:<22} {workers:>7} {result['seconds']:>9.2f} "
+            f"{result['frames_per_s']:>10.1f} {result['mb_per_s']:>8.1f}"
+        )
+        before = previous_results.get(step_key(result))
+        if before is not None and before.get("status") == "ok":
+            line += f" {result['frames_per_s'] / before['frames_per_s']:>15.2f}x"
+        lines.append(line)
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在合成数据上测量各转换工具的吞吐")
+
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=None,
+        help="Use existing HDF5 files in this directory instead of generating synthetic data",
+    )
+    parser.add_argument(
+        "--num-files",
+        type=int,
+        default=2,
+        help="Number of synthetic HDF5 files",
+    )
+    parser.add_argument(
+        "--episodes-per-file",
+        type=int,
+        default=5,
+        help="Episodes per synthetic HDF5 file",
+    )
+    parser.add_argument(
+        "--episode-length",
+        type=int,
+        default=300,
+        help="Mean number of frames per synthetic episode",
+    )
+    parser.add_argument(
+        "--resolution",
+        type=parse_resolution,
+        default=(480, 640),
+        help="Camera resolution of the synthetic data as HEIGHTxWIDTH",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Random seed of the synthetic data",
+    )
+    parser.add_argument(
+        "--steps",
+        nargs="*",
+        choices=STEPS,
+        default=list(STEPS),
+        help="Steps to run (v30_to_v21 converts the hdf2lerobotv21 output and requires that step)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="*",
+        default=[1, 2, 4],
+        help="Worker counts for convert_hdf5_shards",
+    )
+    parser.add_argument(
+        "--cpus",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="CPUs available to the benchmark, split evenly over the workers as --cpus-per-task",
+    )
+    parser.add_argument(
+        "--video-profile",
+        type=str,
+        default="fast",
+        help="Video encoding profile passed to both converters",
+    )
+    parser.add_argument(
+        "--convert-args",
+        type=str,
+        default="",
+        help="Extra arguments passed to both converters, e.g. --convert-args='--stream-video --prefetch-depth 4'",
+    )
+    parser.add_argument(
+        "--repack-episodes",
+        type=int,
+        default=None,
+        help="--episodes-per-file for the repack step (default: half of all episodes)",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("benchmark_results.jsonl"),
+        help="Results file, one JSON record per run is appended",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        default=None,
+        help="Directory for converted outputs and logs (default: a temporary directory that is removed afterwards)",
+    )
+
+    args = parser.parse_args()
+
+    if "v30_to_v21" in args.steps and "hdf2lerobotv21" not in args.steps:
+        parser.error("v30_to_v21 converts the hdf2lerobotv21 output, add hdf2lerobotv21 to --steps")
+
+    work_dir = args.work_dir if args.work_dir is not None else Path(tempfile.mkdtemp(prefix="bench_convert_"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        if args.data_dir is not None:
+            data_dir = args.data_dir
+            hdf5_files = sorted(data_dir.glob("*.hdf5"))
+            if not hdf5_files:
+                print(f"Error: No HDF5 files found in {data_dir}")
+                return 1
+            frames, episodes = 0, 0
+            for hdf5_file in hdf5_files:
+                with h5py.File(hdf5_file, "r") as f:
+                    for episode_name in f.keys():
+                        frames += int(f[episode_name].attrs.get("length", len(f[episode_name]["action"])))
+                        episodes += 1
+            data = {"episodes": episodes, "frames": frames, "bytes": sum(f.stat().st_size for f in hdf5_files)}
+        else:
+            data_dir = work_dir / "data"
+            data = generate(
+                data_dir,
+                num_files=args.num_files,
+                episodes_per_file=args.episodes_per_file,
+                episode_length=args.episode_length,
+                resolution=args.resolution,
+                seed=args.seed,
+            )
+        print(
+            f"Benchmark data: {data['episodes']} episodes, {data['frames']} frames, "
+            f"{data['bytes'] / 1024 / 1024:.1f} MB in {data_dir}\n"
+        )
+
+        # 转换输出写到工作目录，不影响用户的 HF_LEROBOT_HOME
+        lerobot_home = work_dir / "lerobot"
+        # 复用 --work-dir 时清理上一次的转换结果，否则创建数据集会失败
+        shutil.rmtree(lerobot_home, ignore_errors=True)
+        env = {**os.environ, "HF_LEROBOT_HOME": str(lerobot_home)}
+        logs_dir = work_dir / "logs"
+        convert_args = shlex.split(args.convert_args)
+        python = sys.executable
+        results = []
+
+        if "repack" in args.steps:
+            repack_episodes = args.repack_episodes or max(1, data["episodes"] // 2)
+            results.append(
+                run_step(
+                    "repack",
+                    [
+                        python, "convert_parallel/repack_hdf5.py", "repack",
+                        "--input", str(data_dir),
+                        "--output", str(work_dir / "repack"),
+                        "--episodes-per-file", str(repack_episodes),
+                        "--overwrite",
+                    ],
+                    env, data["frames"], data["bytes"], logs_dir / "repack.log",
+                )
+            )
+
+        if "hdf2lerobotv21" in args.steps:
+            results.append(
+                run_step(
+                    "hdf2lerobotv21",
+                    [
+                        python, "hdf2lerobotv21.py",
+                        "--hdf5-root", str(data_dir),
+                        "--all",
+                        "--repo-id", BENCHMARK_REPO_ID,
+                        "--video-profile", args.video_profile,
+                        "--decode-threads", str(args.cpus),
+                        *convert_args,
+                    ],
+                    env, data["frames"], data["bytes"], logs_dir / "hdf2lerobotv21.log",
+                )
+            )
+
+        if "convert_hdf5_shards" in args.steps:
+            for workers in args.workers:
+                results.append(
+                    run_step(
+                        "convert_hdf5_shards",
+                        [
+                            python, "convert_parallel/convert_hdf5_shards.py",
+                            "--hdf5-root", str(data_dir),
+                            "--all",
+                            "--repo-id", f"benchmark/shards_{workers}",
+                            "--workers", str(workers),
+                            "--slurm", "0",
+                            "--cpus-per-task", str(max(1, args.cpus // workers)),
+                            "--logs-dir", str(logs_dir),
+                            "--job-name", f"convert_hdf5_shards_{workers}",
+                            "--video-profile", args.video_profile,
+                            *convert_args,
+                        ],
+                        env, data["frames"], data["bytes"], logs_dir / f"convert_hdf5_shards_{workers}.log",
+                        workers=workers,
+                    )
+                )
+
+        if "v30_to_v21" in args.steps:
+            dataset_root = lerobot_home / BENCHMARK_REPO_ID
+            if dataset_root.exists():
+                results.append(
+                    run_step(
+                        "v30_to_v21",
+                        [python, "convert_parallel/lerobot_v30_to_v21.py", "--repo-id", BENCHMARK_REPO_ID],
+                        env, data["frames"], dir_size(dataset_root), logs_dir / "v30_to_v21.log",
+                    )
+                )
+            else:
+                print("[v30_to_v21] skipped, hdf2lerobotv21 produced no dataset")
+
+        config = {
+            "data_dir": str(args.data_dir) if args.data_dir is not None else None,
+            "episodes": data["episodes"],
+            "frames": data["frames"],
+            "bytes": data["bytes"],
+            "seed": None if args.data_dir is not None else args.seed,
+            "video_profile": args.video_profile,
+            "convert_args": args.convert_args,
+            "cpus": args.cpus,
+        }
+        record = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "config": config,
+            "results": results,
+        }
+        previous = load_previous(args.output, config)
+
+        print()
+        for line in format_results(results, previous):
+            print(line)
+
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"\nResults appended to {args.output}")
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return 0 if all(result["status"] == "ok" for result in results) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
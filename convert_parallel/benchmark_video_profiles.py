@@ -0,0 +1,169 @@
+"""
+比较不同视频编码配置的编码速度与输出大小
+
+从 HDF5 中取样若干 episodes，解码后按 LeRobotDataset 的方式写成临时 PNG，
+再分别使用每个编码配置编码，统计编码帧率和输出字节数
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import cv2
+import h5py
+
+from hdf5_conversion import (
+    CAMERA_DATASETS,
+    VIDEO_PROFILES,
+    FrameDecoder,
+    encode_video_with_profile,
+    read_episode,
+)
+
+
+def dump_sample_frames(
+    hdf5_files: List[str],
+    num_episodes: int,
+    max_frames: int,
+    output_dir: Path,
+    decode_threads: int,
+) -> Tuple[List[Path], int]:
+    """
+    将前 num_episodes 个 episode 的每个相机解码写成 PNG 目录
+
+    Returns:
+        (PNG 目录列表, 每个相机的总帧数)
+    """
+    image_dirs = []
+    total_frames = 0
+    decoder = FrameDecoder(num_threads=decode_threads)
+    try:
+        for hdf5_file in hdf5_files:
+            with h5py.File(hdf5_file, "r") as f:
+                for episode_name in f.keys():
+                    if len(image_dirs) >= num_episodes * len(CAMERA_DATASETS):
+                        return image_dirs, total_frames
+
+                    episode_dirs = [
+                        output_dir / f"{Path(hdf5_file).stem}_{episode_name}" / camera for camera in CAMERA_DATASETS
+                    ]
+                    for image_dir in episode_dirs:
+                        image_dir.mkdir(parents=True, exist_ok=True)
+
+                    episode = read_episode(f[episode_name], decoder)
+                    camera_images = [episode["images"][key] for key in CAMERA_DATASETS.values()]
+                    for frame_index, images in enumerate(zip(*camera_images)):
+                        if frame_index >= max_frames:
+                            break
+                        for image_dir, image in zip(episode_dirs, images):
+                            cv2.imwrite(
+                                str(image_dir / f"frame-{frame_index:06d}.png"),
+                                image,
+                                [cv2.IMWRITE_PNG_COMPRESSION, 1],
+                            )
+                        total_frames += 1
+                    image_dirs.extend(episode_dirs)
+    finally:
+        decoder.close()
+    return image_dirs, total_frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较不同视频编码配置的编码速度与输出大小")
+
+    parser.add_argument(
+        "--hdf5-root",
+        type=Path,
+        required=True,
+        help="Root directory containing HDF5 files",
+    )
+    parser.add_argument(
+        "--hdf5-files",
+        nargs="*",
+        help="Specific HDF5 files to sample (relative to hdf5-root, default: all)",
+    )
+    parser.add_argument(
+        "--num-episodes",
+        type=int,
+        default=2,
+        help="Number of episodes to sample",
+    )
+    parser.add_argument(
+        "--max-frames",
+        type=int,
+        default=300,
+        help="Maximum frames per episode",
+    )
+    parser.add_argument(
+        "--profiles",
+        nargs="*",
+        choices=sorted(VIDEO_PROFILES),
+        default=sorted(VIDEO_PROFILES),
+        help="Encoding profiles to benchmark",
+    )
+    parser.add_argument(
+        "--fps",
+        type=int,
+        default=30,
+        help="Frames per second for video data",
+    )
+    parser.add_argument(
+        "--encoder-threads",
+        type=int,
+        default=None,
+        help="Override the encoder thread count of every profile",
+    )
+    parser.add_argument(
+        "--decode-threads",
+        type=int,
+        default=4,
+        help="Number of JPEG decode threads",
+    )
+
+    args = parser.parse_args()
+
+    if args.hdf5_files:
+        hdf5_files = [str(args.hdf5_root / f) for f in args.hdf5_files]
+    else:
+        hdf5_files = sorted(str(f) for f in args.hdf5_root.glob("*.hdf5"))
+    if not hdf5_files:
+        print("Error: No HDF5 files found to sample")
+        return 1
+
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_profiles_"))
+    try:
+        image_dirs, total_frames = dump_sample_frames(
+            hdf5_files, args.num_episodes, args.max_frames, work_dir / "images", args.decode_threads
+        )
+        num_images = total_frames * len(CAMERA_DATASETS)
+        print(f"Sampled {len(image_dirs) // len(CAMERA_DATASETS)} episodes, {num_images} frames over {len(CAMERA_DATASETS)} cameras\n")
+
+        print(f"{'profile':<10} {'codec':<6} {'encode s':>9} {'fps':>8} {'MB':>9} {'KB/frame':>9}")
+        for name in args.profiles:
+            profile = dict(VIDEO_PROFILES[name])
+            if args.encoder_threads is not None:
+                profile["threads"] = args.encoder_threads
+
+            output_bytes = 0
+            start = time.perf_counter()
+            for i, image_dir in enumerate(image_dirs):
+                video_path = work_dir / "videos" / name / f"{i:04d}.mp4"
+                encode_video_with_profile(image_dir, video_path, args.fps, profile)
+                output_bytes += video_path.stat().st_size
+            elapsed = time.perf_counter() - start
+
+            print(
+                f"{name:<10} {profile['codec']:<6} {elapsed:>9.2f} {num_images / elapsed:>8.1f} "
+                f"{output_bytes / 1024 / 1024:>9.2f} {output_bytes / 1024 / max(num_images, 1):>9.1f}"
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
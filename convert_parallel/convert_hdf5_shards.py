@@ -1,151 +1,567 @@
 """
 并行转换 HDF5 文件到 LeRobot Dataset
-每个 worker 处理分配给它的 HDF5 文件，生成独立的 shard
+以 episode 为粒度分配任务，每个 worker 处理分配给它的 episodes，生成独立的 shard
 """
 
 import argparse
+import fcntl
+import heapq
+import itertools
+import json
+import shutil
 import h5py
-import numpy as np
 import os
-import cv2
+import socket
+import sys
+import time
 from pathlib import Path
-from typing import Optional, List
+from typing import Dict, Iterable, Iterator, Optional, List, Sequence, Tuple
 
 from datatrove.executor import LocalPipelineExecutor
 from datatrove.executor.slurm import SlurmPipelineExecutor
 from datatrove.pipeline.base import PipelineStep
 
-from lerobot.datasets.lerobot_dataset import LeRobotDataset
+from lerobot.utils.constants import HF_LEROBOT_HOME
 from lerobot.utils.utils import init_logging
 
+from hdf5_conversion import (
+    CAMERA_DATASETS,
+    DEFAULT_FRAME_CACHE_GB,
+    DEFAULT_READ_WINDOW,
+    DEFAULT_VIDEO_PROFILE,
+    STRIDE_REDUCTIONS,
+    VIDEO_PROFILES,
+    BiPiperDataset,
+    DecodedFrameCache,
+    EpisodePrefetcher,
+    FrameDecoder,
+    RankProfiler,
+    ReadBuffers,
+    StageTimer,
+    build_features,
+    check_ffmpeg_encoder,
+    episode_storage_size,
+    iter_episode_groups,
+    parse_resolution,
+    process_data,
+    read_buffer_slots,
+    requires_ffmpeg_cli,
+    resolve_frame_stride,
+    timed,
+)
 
-# feature definition for bi-arm piper data
-BI_PIPER_FEATURES = {
-    "action": {
-        "dtype": "float32",
-        "shape": (14,),
-        "names": [
-            "left_joint_1.pos",
-            "left_joint_2.pos",
-            "left_joint_3.pos",
-            "left_joint_4.pos",
-            "left_joint_5.pos",
-            "left_joint_6.pos",
-            "left_joint_7.pos",
-            "right_joint_1.pos",
-            "right_joint_2.pos",
-            "right_joint_3.pos",
-            "right_joint_4.pos",
-            "right_joint_5.pos",
-            "right_joint_6.pos",
-            "right_joint_7.pos",
-        ],
-    },
-    "observation.state": {
-        "dtype": "float32",
-        "shape": (14,),
-        "names": [
-            "left_joint_1.pos",
-            "left_joint_2.pos",
-            "left_joint_3.pos",
-            "left_joint_4.pos",
-            "left_joint_5.pos",
-            "left_joint_6.pos",
-            "left_joint_7.pos",
-            "right_joint_1.pos",
-            "right_joint_2.pos",
-            "right_joint_3.pos",
-            "right_joint_4.pos",
-            "right_joint_5.pos",
-            "right_joint_6.pos",
-            "right_joint_7.pos",
-        ],
-    },
-    "observation.images.left_wrist": {
-        "dtype": "video",
-        "shape": [480, 640, 3],
-        "names": ["height", "width", "channels"],
-        "video_info": {
-            "video.height": 480,
-            "video.width": 640,
-            "video.codec": "av1",
-            "video.pix_fmt": "yuv420p",
-            "video.is_depth_map": False,
-            "video.fps": 30.0,
-            "video.channels": 3,
-            "has_audio": False,
-        },
-    },
-    "observation.images.mid": {
-        "dtype": "video",
-        "shape": [480, 640, 3],
-        "names": ["height", "width", "channels"],
-        "video_info": {
-            "video.height": 480,
-            "video.width": 640,
-            "video.codec": "av1",
-            "video.pix_fmt": "yuv420p",
-            "video.is_depth_map": False,
-            "video.fps": 30.0,
-            "video.channels": 3,
-            "has_audio": False,
-        },
-    },
-    "observation.images.right_wrist": {
-        "dtype": "video",
-        "shape": [480, 640, 3],
-        "names": ["height", "width", "channels"],
-        "video_info": {
-            "video.height": 480,
-            "video.width": 640,
-            "video.codec": "av1",
-            "video.pix_fmt": "yuv420p",
-            "video.is_depth_map": False,
-            "video.fps": 30.0,
-            "video.channels": 3,
-            "has_audio": False,
-        },
-    },
-}
-
-
-def process_data(dataset: LeRobotDataset, episode_group: h5py.Group, episode_name: str) -> bool:
-    """处理单个 episode 的数据"""
-    import logging
-
-    episode_instruction = episode_group.attrs.get("instruction")
-    episode_frame_length = episode_group.attrs.get("length")
-
-    action = np.array(episode_group["action"])
-    state = np.array(episode_group["state"])
-    image_left_bytes = episode_group["image_left"][()]
-    image_mid_bytes = episode_group["image_mid"][()]
-    image_right_bytes = episode_group["image_right"][()]
-
-    decode = lambda x: x if isinstance(x, np.ndarray) and x.ndim == 3 else cv2.imdecode(np.frombuffer(x, np.uint8), cv2.IMREAD_COLOR)
-    for frame_index in range(episode_frame_length):
-        image_left = decode(image_left_bytes[frame_index])
-        image_mid = decode(image_mid_bytes[frame_index])
-        image_right = decode(image_right_bytes[frame_index])
-
-        frame = {
-            "action": action[frame_index],
-            "observation.state": state[frame_index],
-            "observation.images.left_wrist": image_left,
-            "observation.images.mid": image_mid,
-            "observation.images.right_wrist": image_right,
-            "task": episode_instruction,
+
+# 每个 rank 写出进度状态文件的最小间隔（秒）
+DEFAULT_STATUS_INTERVAL = 30
+
+
+def estimate_episode_costs(hdf5_files: Sequence[str]) -> Tuple[Dict[Tuple[str, str], int], str]:
+    """
+    枚举所有 (hdf5 文件, episode 名称) 并估计每个 episode 的处理代价
+
+    优先使用 episode 的 length 属性（帧数）；
+    只要有 episode 缺少 length 属性，就统一退化为 episode 占用的字节数，避免混用两种单位
+
+    Returns:
+        ({(文件, episode): 代价}, 代价单位 "frames" 或 "bytes")
+    """
+    frame_costs = {}
+    missing_length = False
+    for hdf5_file in hdf5_files:
+        with h5py.File(hdf5_file, "r") as f:
+            for episode_name in f.keys():
+                length = f[episode_name].attrs.get("length")
+                if length is None:
+                    missing_length = True
+                    break
+                frame_costs[(hdf5_file, episode_name)] = int(length)
+        if missing_length:
+            break
+    if not missing_length:
+        return frame_costs, "frames"
+
+    # 字节数包含全局堆中的 JPEG 数据（见 episode_storage_size），只在需要时计算
+    byte_costs = {}
+    for hdf5_file in hdf5_files:
+        with h5py.File(hdf5_file, "r") as f:
+            for episode_name in f.keys():
+                byte_costs[(hdf5_file, episode_name)] = episode_storage_size(f[episode_name])
+    return byte_costs, "bytes"
+
+
+def lpt_schedule(costs: Dict[str, int], world_size: int) -> List[List[str]]:
+    """
+    最长处理时间优先 (LPT) 调度
+    按代价从大到小依次分配给当前总负载最小的 rank，排序与并列规则固定，保证每个 rank 算出的结果一致
+
+    Returns:
+        每个 rank 分到的任务列表
+    """
+    assignments = [[] for _ in range(world_size)]
+    loads = [(0, rank) for rank in range(world_size)]
+    heapq.heapify(loads)
+    for item in sorted(costs, key=lambda item: (-costs[item], item)):
+        load, rank = heapq.heappop(loads)
+        assignments[rank].append(item)
+        heapq.heappush(loads, (load + costs[item], rank))
+    return assignments
+
+
+def format_schedule(assignments: List[List[str]], costs: Dict[str, int], unit: str) -> List[str]:
+    """生成每个 rank 预测负载的文本行，最后一行为整体 makespan 与不均衡度"""
+    loads = [sum(costs[item] for item in items) for items in assignments]
+    lines = [
+        f"rank {rank}: {len(items)} items, predicted load {load} {unit}"
+        for rank, (items, load) in enumerate(zip(assignments, loads))
+    ]
+    mean_load = sum(loads) / len(loads) if loads else 0
+    makespan = max(loads, default=0)
+    imbalance = makespan / mean_load if mean_load else 1.0
+    lines.append(f"predicted makespan {makespan} {unit} (mean {mean_load:.0f} {unit}, max/mean {imbalance:.2f})")
+    return lines
+
+
+class EpisodeWorkQueue:
+    """
+    基于共享目录的动态任务队列，用于本地多 worker 模式
+    所有 episode 按代价从大到小写入 episodes.json，worker 通过加锁的游标文件依次领取下一个 episode，
+    处理快的 worker 会自动领取更多任务，不会出现提前分配导致的空闲
+    """
+
+    def __init__(self, queue_dir: str):
+        self.queue_dir = Path(queue_dir)
+        self._episodes = None
+
+    @classmethod
+    def create(cls, queue_dir: str, episodes: Sequence[Tuple[str, str]]) -> "EpisodeWorkQueue":
+        """写入任务列表并重置游标"""
+        queue_path = Path(queue_dir)
+        queue_path.mkdir(parents=True, exist_ok=True)
+        (queue_path / "episodes.json").write_text(json.dumps([list(episode) for episode in episodes]))
+        (queue_path / "cursor").write_text("0")
+        return cls(queue_dir)
+
+    def claim(self) -> Optional[Tuple[str, str]]:
+        """领取下一个 episode，队列为空时返回 None"""
+        if self._episodes is None:
+            self._episodes = [tuple(episode) for episode in json.loads((self.queue_dir / "episodes.json").read_text())]
+
+        with open(self.queue_dir / "cursor", "r+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                index = int(f.read() or 0)
+                if index >= len(self._episodes):
+                    return None
+                f.seek(0)
+                f.write(str(index + 1))
+                f.truncate()
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return self._episodes[index]
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return iter(self.claim, None)
+
+
+def canonical_episode(hdf5_file: str, episode_name: str) -> Tuple[str, str]:
+    """以文件的真实路径标识 episode，续转时 --hdf5-root 写法不同（相对路径、结尾斜杠、符号链接）也能匹配"""
+    return os.path.realpath(hdf5_file), episode_name
+
+
+class ShardManifest:
+    """
+    记录 shard 中已经提交的 (hdf5 文件, episode)，用于任务中断后的断点续转
+
+    每个 episode 在 save_episode 之前追加一行；读取时按 meta/info.json 中的 total_episodes 截断，
+    因此无论中断发生在追加之后还是 save_episode 之中，清单都与 shard 中实际保存的 episodes 一致。
+    文件路径一律记录为 os.path.realpath，比较时也需先经过 canonical_episode
+    """
+
+    FILENAME = "convert_manifest.jsonl"
+
+    def __init__(self, shard_root: Path):
+        self.shard_root = Path(shard_root)
+        self.path = self.shard_root / "meta" / self.FILENAME
+
+    def _saved_episodes(self) -> int:
+        info_path = self.shard_root / "meta" / "info.json"
+        if not info_path.exists():
+            return 0
+        return int(json.loads(info_path.read_text()).get("total_episodes", 0))
+
+    def load(self, saved_episodes: Optional[int] = None) -> List[Tuple[str, str]]:
+        """读取已提交的 episodes，saved_episodes 默认取自 info.json"""
+        if not self.path.exists():
+            return []
+        if saved_episodes is None:
+            saved_episodes = self._saved_episodes()
+        entries = []
+        with open(self.path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    record = json.loads(line)
+                    entries.append(canonical_episode(record["hdf5_file"], record["episode"]))
+        return entries[:saved_episodes]
+
+    @staticmethod
+    def _write_record(f, episode_index: int, hdf5_file: str, episode_name: str):
+        record = {"episode_index": episode_index, "hdf5_file": os.path.realpath(hdf5_file), "episode": episode_name}
+        f.write(json.dumps(record) + "\n")
+
+    def write(self, entries: Sequence[Tuple[str, str]]):
+        """用给定的 episodes 重写清单"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w") as f:
+            for episode_index, (hdf5_file, episode_name) in enumerate(entries):
+                self._write_record(f, episode_index, hdf5_file, episode_name)
+
+    def append(self, episode_index: int, hdf5_file: str, episode_name: str):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            self._write_record(f, episode_index, hdf5_file, episode_name)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class RankStatus:
+    """
+    定期把当前 rank 的进度写入 <status_dir>/rank_XXXXX.json，由 status 子命令汇总
+
+    进度以调度代价（帧数或字节数）计，与 LPT 分配使用相同的单位，便于估计剩余时间；
+    文件先写入临时文件再原子替换，读取方不会看到写了一半的内容
+    """
+
+    def __init__(
+        self,
+        status_dir: str,
+        rank: int,
+        world_size: int,
+        shard: str,
+        interval: float = DEFAULT_STATUS_INTERVAL,
+        episodes_total: Optional[int] = None,
+        cost_total: Optional[int] = None,
+        cost_unit: str = "frames",
+    ):
+        self.path = Path(status_dir) / f"rank_{rank:05d}.json"
+        self.rank = rank
+        self.world_size = world_size
+        self.shard = shard
+        self.interval = interval
+        self.episodes_total = episodes_total
+        self.cost_total = cost_total
+        self.cost_unit = cost_unit
+        self.state = "running"
+        self.started_at = time.time()
+        self.episodes_done = 0
+        self.frames_done = 0
+        self.bytes_done = 0
+        self.cost_done = 0
+        self.current_file = None
+        self.current_episode = None
+        self._last_write = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.write(force=True)
+
+    def start_episode(self, hdf5_file: str, episode_name: str):
+        self.current_file = hdf5_file
+        self.current_episode = episode_name
+        self.write()
+
+    def end_episode(self, frames: int, nbytes: int, cost: int):
+        self.episodes_done += 1
+        self.frames_done += frames
+        self.bytes_done += nbytes
+        self.cost_done += cost
+        self.write()
+
+    def finish(self, state: str):
+        self.state = state
+        self.current_file = None
+        self.current_episode = None
+        self.write(force=True)
+
+    def write(self, force: bool = False):
+        import logging
+
+        now = time.time()
+        if not force and self._last_write is not None and now - self._last_write < self.interval:
+            return
+        self._last_write = now
+        elapsed = now - self.started_at
+        record = {
+            "rank": self.rank,
+            "world_size": self.world_size,
+            "shard": self.shard,
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "state": self.state,
+            "interval_s": self.interval,
+            "started_at": self.started_at,
+            "updated_at": now,
+            "episodes_done": self.episodes_done,
+            "episodes_total": self.episodes_total,
+            "frames_done": self.frames_done,
+            "bytes_done": self.bytes_done,
+            "cost_unit": self.cost_unit,
+            "cost_done": self.cost_done,
+            "cost_total": self.cost_total,
+            "frames_per_s": self.frames_done / elapsed if elapsed > 0 else 0.0,
+            "bytes_per_s": self.bytes_done / elapsed if elapsed > 0 else 0.0,
+            "current_file": self.current_file,
+            "current_episode": self.current_episode,
         }
-        dataset.add_frame(frame=frame)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            tmp_path.write_text(json.dumps(record))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            # 状态文件只用于监控，写入失败不影响转换
+            logging.warning(f"Worker {self.rank}: Failed to write status file {self.path} ({e})")
+
+
+def write_job_status(
+    status_dir: Path,
+    job_name: str,
+    world_size: int,
+    schedule: str,
+    episode_costs: Dict[Tuple[str, str], int],
+    cost_unit: str,
+    rank_costs: Optional[List[int]] = None,
+):
+    """写出整个任务的总工作量，供 status 子命令在 rank 尚未启动时估计剩余时间"""
+    status_dir.mkdir(parents=True, exist_ok=True)
+    for path in status_dir.glob("rank_*.json"):
+        # 清理上一次运行留下的状态
+        path.unlink()
+    job = {
+        "job_name": job_name,
+        "world_size": world_size,
+        "schedule": schedule,
+        "submitted_at": time.time(),
+        "episodes_total": len(episode_costs),
+        "cost_unit": cost_unit,
+        "cost_total": sum(episode_costs.values()),
+        "rank_costs": rank_costs,
+    }
+    (status_dir / "job.json").write_text(json.dumps(job, indent=2))
+
+
+def load_status(status_dir: Path) -> Tuple[Optional[dict], List[dict]]:
+    """读取 job.json 和所有 rank 的状态文件"""
+    job_path = status_dir / "job.json"
+    job = json.loads(job_path.read_text()) if job_path.exists() else None
+    ranks = []
+    for path in sorted(status_dir.glob("rank_*.json")):
+        try:
+            ranks.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return job, ranks
+
+
+def summarize_status(job: Optional[dict], ranks: List[dict], now: float, stale_after: Optional[float] = None) -> dict:
+    """
+    汇总各 rank 的进度，估计每个 rank 和整个任务的剩余时间
+
+    静态调度下 rank 之间不能互相分担任务，整体剩余时间取各 rank 剩余时间的最大值；
+    动态调度下所有 worker 共享队列，用总剩余工作量除以总吞吐估计
+    """
+    world_size = job["world_size"] if job else max((rank["world_size"] for rank in ranks), default=0)
+    rank_costs = (job or {}).get("rank_costs")
+    by_rank = {rank["rank"]: rank for rank in ranks}
+
+    rows = []
+    for index in range(world_size):
+        status = by_rank.get(index)
+        if status is None:
+            remaining = rank_costs[index] if rank_costs else None
+            rows.append({"rank": index, "state": "pending", "remaining": remaining, "rate": 0.0, "eta_s": None})
+            continue
+        elapsed = max(now - status["started_at"], 1e-9)
+        rate = status["cost_done"] / elapsed
+        remaining = None
+        if status["cost_total"] is not None:
+            remaining = max(status["cost_total"] - status["cost_done"], 0)
+        state = status["state"]
+        limit = stale_after if stale_after is not None else 3 * status["interval_s"] + 60
+        if state == "running" and now - status["updated_at"] > limit:
+            state = "stale"
+        eta = None
+        if state == "done":
+            remaining, eta = 0, 0.0
+        elif remaining is not None and rate > 0:
+            eta = remaining / rate
+        rows.append({**status, "state": state, "remaining": remaining, "rate": rate, "eta_s": eta})
+
+    reported = [row for row in rows if row["state"] != "pending"]
+    cost_rate = sum(row["rate"] for row in reported if row["state"] == "running")
+    cost_done = sum(row["cost_done"] for row in reported)
+    if job is not None:
+        cost_total = job["cost_total"]
+        episodes_total = job["episodes_total"]
+    else:
+        cost_total = None
+        episodes_total = None
+
+    # 整体剩余时间
+    if rank_costs is None and cost_total is not None:
+        remaining = max(cost_total - cost_done, 0)
+        eta = remaining / cost_rate if cost_rate > 0 else (0.0 if remaining == 0 else None)
+    else:
+        rates = sorted(row["rate"] for row in reported if row["rate"] > 0)
+        median_rate = rates[len(rates) // 2] if rates else 0.0
+        for row in rows:
+            if row["eta_s"] is None and row["remaining"] is not None and row["state"] == "pending" and median_rate > 0:
+                row["eta_s"] = row["remaining"] / median_rate
+        etas = [row["eta_s"] for row in rows]
+        eta = max(etas, default=None) if etas and None not in etas else None
+
+    # 剩余时间明显长于中位数、状态文件长时间未更新或失败的 rank 视为拖尾
+    running_etas = sorted(row["eta_s"] for row in rows if row["state"] == "running" and row["eta_s"] is not None)
+    median_eta = running_etas[len(running_etas) // 2] if running_etas else None
+    for row in rows:
+        row["straggler"] = row["state"] in ("stale", "failed") or (
+            row["state"] == "running"
+            and median_eta is not None
+            and row["eta_s"] is not None
+            and row["eta_s"] > 1.5 * median_eta + 60
+        )
+
+    return {
+        "world_size": world_size,
+        "states": {state: sum(row["state"] == state for row in rows) for state in ("pending", "running", "stale", "failed", "done")},
+        "episodes_done": sum(row.get("episodes_done", 0) for row in reported),
+        "episodes_total": episodes_total,
+        "frames_per_s": sum(row["frames_per_s"] for row in reported if row["state"] == "running"),
+        "bytes_per_s": sum(row["bytes_per_s"] for row in reported if row["state"] == "running"),
+        "cost_unit": (job or {}).get("cost_unit") or next((row["cost_unit"] for row in reported), "frames"),
+        "cost_done": cost_done,
+        "cost_total": cost_total,
+        "eta_s": eta,
+        "ranks": rows,
+    }
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{seconds}s"
+
+
+def format_status(summary: dict, now: float, top: int = 10) -> List[str]:
+    """生成 status 子命令输出的文本行：整体进度、吞吐与剩余时间，以及剩余时间最长的 rank"""
+    lines = []
+    states = ", ".join(f"{count} {state}" for state, count in summary["states"].items() if count)
+    lines.append(f"{summary['world_size']} ranks: {states}")
+
+    episodes_total = summary["episodes_total"] if summary["episodes_total"] is not None else "?"
+    progress = ""
+    if summary["cost_total"]:
+        progress = f" ({summary['cost_done'] / summary['cost_total']:.1%} of {summary['cost_unit']})"
+    lines.append(f"episodes {summary['episodes_done']}/{episodes_total}{progress}")
+    lines.append(
+        f"throughput {summary['frames_per_s']:.1f} frames/s, {summary['bytes_per_s'] / 1024 / 1024:.1f} MB/s, "
+        f"ETA {format_duration(summary['eta_s'])}"
+    )
+    lines.append("")
+
+    def sort_key(row):
+        return (not row["straggler"], -(row["eta_s"] if row["eta_s"] is not None else float("inf")))
+
+    rows = sorted(summary["ranks"], key=sort_key)[:top]
+    lines.append(f"{'rank':<6} {'state':<8} {'episodes':>9} {'fps':>8} {'MB/s':>7} {'ETA':>8} {'updated':>8}  current")
+    for row in rows:
+        if row["state"] == "pending":
+            lines.append(f"{row['rank']:<6} {'pending':<8} {'-':>9} {'-':>8} {'-':>7} {format_duration(row['eta_s']):>8} {'-':>8}")
+            continue
+        total = row["episodes_total"] if row["episodes_total"] is not None else "?"
+        current = f"{Path(row['current_file']).name}:{row['current_episode']}" if row["current_file"] else ""
+        flag = " *" if row["straggler"] else ""
+        lines.append(
+            f"{row['rank']:<6} {row['state']:<8} {str(row['episodes_done']) + '/' + str(total):>9} "
+            f"{row['frames_per_s']:>8.1f} {row['bytes_per_s'] / 1024 / 1024:>7.1f} {format_duration(row['eta_s']):>8} "
+            f"{format_duration(now - row['updated_at']):>8}  {current}{flag}"
+        )
+    if any(row["straggler"] for row in summary["ranks"]):
+        lines.append("* straggler: ETA well above the median, stale status file or failed")
+    return lines
+
+
+def status_main(argv: List[str]) -> int:
+    """status 子命令：读取各 rank 的状态文件，打印整体吞吐、拖尾 rank 和剩余时间"""
+    parser = argparse.ArgumentParser(
+        prog="convert_hdf5_shards.py status",
+        description="Show aggregate throughput, stragglers and ETA of a running conversion",
+    )
+    parser.add_argument(
+        "--logs-dir",
+        type=Path,
+        default=Path("./logs"),
+        help="Path to logs directory for datatrove",
+    )
+    parser.add_argument(
+        "--job-name",
+        type=str,
+        default="convert_hdf5",
+        help="Job name used in slurm/logs",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=10,
+        help="Number of ranks to list, stragglers and longest ETA first",
+    )
+    parser.add_argument(
+        "--stale-after",
+        type=float,
+        default=None,
+        help="Seconds without a status update before a running rank is reported as stale (default: 3 x status interval + 60)",
+    )
+    parser.add_argument(
+        "--watch",
+        type=float,
+        default=None,
+        help="Refresh every N seconds until interrupted",
+    )
+
+    args = parser.parse_args(argv)
 
-    logging.info(f"Processed episode '{episode_name}' with {episode_frame_length} frames")
-    return True
+    status_dir = args.logs_dir / args.job_name / "status"
+    while True:
+        job, ranks = load_status(status_dir)
+        if job is None and not ranks:
+            print(f"Error: No status files found in {status_dir}")
+            return 1
+        now = time.time()
+        lines = format_status(summarize_status(job, ranks, now, args.stale_after), now, args.top)
+        if args.watch is None:
+            print("\n".join(lines))
+            return 0
+        print("\033[2J\033[H" + time.strftime("%H:%M:%S") + f"  {status_dir}\n\n" + "\n".join(lines), flush=True)
+        try:
+            time.sleep(args.watch)
+        except KeyboardInterrupt:
+            return 0
+
+
+def shard_repo_id_for(repo_id: str, world_size: int, rank: int) -> str:
+    """生成 shard 的 repo_id"""
+    return f"{repo_id}_world_{world_size}_rank_{rank}"
 
 
 class ConvertHDF5Shards(PipelineStep):
     """
     并行转换 HDF5 文件到 LeRobot Dataset
-    每个 worker 处理分配给它的 HDF5 文件
+    每个 worker 处理分配给它的 (HDF5 文件, episode)
     """
 
     def __init__(
@@ -154,19 +570,138 @@ class ConvertHDF5Shards(PipelineStep):
         repo_id: str,
         robot_type: str = "bi_piper",
         fps: int = 30,
+        decode_threads: int = 1,
+        read_window: int = DEFAULT_READ_WINDOW,
+        prefetch_depth: int = 0,
+        episode_costs: Optional[Dict[Tuple[str, str], int]] = None,
+        cost_unit: str = "frames",
+        work_queue_dir: Optional[str] = None,
+        resume: bool = False,
+        video_profile: str = DEFAULT_VIDEO_PROFILE,
+        encode_workers: Optional[int] = None,
+        encode_cpus: int = 0,
+        stream_video: bool = False,
+        jpeg_passthrough: bool = False,
+        target_resolution: Optional[Tuple[int, int]] = None,
+        frame_stride: int = 1,
+        stride_reduce: str = "sample",
+        frame_cache_dir: Optional[str] = None,
+        frame_cache_bytes: int = 0,
+        timing_dir: Optional[str] = None,
+        status_dir: Optional[str] = None,
+        status_interval: float = DEFAULT_STATUS_INTERVAL,
+        profile_dir: Optional[str] = None,
+        profile_episodes: Optional[int] = None,
     ):
         super().__init__()
         self.hdf5_files = sorted(hdf5_files)
         self.repo_id = repo_id
         self.robot_type = robot_type
         self.fps = fps
+        self.decode_threads = decode_threads
+        self.read_window = read_window
+        self.prefetch_depth = prefetch_depth
+        # datatrove 会把 step 的属性写入 executor.json，JSON 不支持 tuple 键，因此保存为 (文件, episode, 代价) 列表
+        self.episode_costs = None if episode_costs is None else [(*episode, cost) for episode, cost in episode_costs.items()]
+        self.cost_unit = cost_unit
+        self.work_queue_dir = work_queue_dir
+        self.resume = resume
+        self.video_profile = video_profile
+        self.encode_workers = encode_workers
+        self.encode_cpus = encode_cpus
+        self.stream_video = stream_video
+        self.jpeg_passthrough = jpeg_passthrough
+        self.target_resolution = target_resolution
+        self.frame_stride = frame_stride
+        self.stride_reduce = stride_reduce
+        self.frame_cache_dir = frame_cache_dir
+        self.frame_cache_bytes = frame_cache_bytes
+        self.timing_dir = timing_dir
+        self.status_dir = status_dir
+        self.status_interval = status_interval
+        self.profile_dir = profile_dir
+        self.profile_episodes = profile_episodes
+
+    def _episode_costs(self) -> Dict[Tuple[str, str], int]:
+        """{(HDF5 文件, episode): 代价}，未传入代价时现场估计"""
+        if self.episode_costs is None:
+            costs, self.cost_unit = estimate_episode_costs(self.hdf5_files)
+            self.episode_costs = [(*episode, cost) for episode, cost in costs.items()]
+        return {(hdf5_file, episode_name): cost for hdf5_file, episode_name, cost in self.episode_costs}
 
-    def _allocate_files_by_rank(self, rank: int, world_size: int) -> List[str]:
+    def _allocate_episodes_by_rank(self, rank: int, world_size: int) -> List[Tuple[str, str]]:
         """
-        根据 rank 分配 HDF5 文件
-        使用轮询分配确保负载均衡
+        根据 rank 分配 (HDF5 文件, episode)
+        以 episode 为粒度按帧数做 LPT 装箱，单个大文件也可以分散到任意多个 worker，无需事先 repack
         """
-        return [f for i, f in enumerate(self.hdf5_files) if i % world_size == rank]
+        import logging
+
+        costs = self._episode_costs()
+        assignments = lpt_schedule(costs, world_size)
+        predicted_load = sum(costs[episode] for episode in assignments[rank])
+        logging.info(f"Worker {rank}: Predicted load {predicted_load} {self.cost_unit}")
+        # 按文件和 episode 顺序处理，连续的 episode 可以复用同一个文件句柄
+        return sorted(assignments[rank])
+
+    def _resume_shard(self, shard_repo_id: str, rank: int) -> Tuple[Optional[BiPiperDataset], List[Tuple[str, str]]]:
+        """
+        重新打开已有的 shard 以便继续写入
+
+        Returns:
+            (可继续写入的 dataset, 已提交的 episodes)；无法续转时把旧 shard 移到一旁并返回 (None, [])
+        """
+        import logging
+
+        shard_root = HF_LEROBOT_HOME / shard_repo_id
+        if not shard_root.exists():
+            return None, []
+
+        manifest = ShardManifest(shard_root)
+        committed = manifest.load()
+        if committed:
+            try:
+                dataset = BiPiperDataset(shard_repo_id)
+                dataset.configure_encoding(
+                    self.video_profile, self.encode_workers, self.encode_cpus, self.stream_video, self.jpeg_passthrough
+                )
+                committed = committed[: dataset.meta.total_episodes]
+                manifest.write(committed)
+                # 中断的 episode 尚未保存，其编号与下一个 episode 相同，先删掉它留下的临时 PNG
+                interrupted_index = dataset.meta.total_episodes
+                for key in dataset.meta.camera_keys:
+                    shutil.rmtree(dataset._image_dir(key, interrupted_index), ignore_errors=True)
+                dataset.episode_buffer = dataset.create_episode_buffer()
+                logging.info(f"Worker {rank}: Resuming shard '{shard_repo_id}' with {len(committed)} committed episodes")
+                return dataset, committed
+            except Exception as e:
+                reason = f"failed to reopen it ({e})"
+        else:
+            reason = "it has no committed episodes"
+
+        # 不删除无法续转的 shard，改名保留以便检查，再从头转换
+        stale_root = shard_root.with_name(f"{shard_root.name}.stale-{time.strftime('%Y%m%d-%H%M%S')}")
+        shard_root.rename(stale_root)
+        logging.warning(f"Worker {rank}: Cannot resume shard '{shard_repo_id}': {reason}; moved it to {stale_root} and restarting")
+        return None, []
+
+    def _rank_status(
+        self, rank: int, world_size: int, shard_repo_id: str, episodes: Optional[Iterable[Tuple[str, str]]]
+    ) -> Optional[RankStatus]:
+        """创建本 rank 的状态文件；静态分配时已知本 rank 的全部任务，动态调度只有整个任务的总量（见 job.json）"""
+        if not self.status_dir:
+            return None
+        static = isinstance(episodes, list)
+        costs = self._episode_costs() if self.episode_costs is not None else {}
+        return RankStatus(
+            self.status_dir,
+            rank,
+            world_size,
+            shard_repo_id,
+            self.status_interval,
+            episodes_total=len(episodes) if static else None,
+            cost_total=sum(costs.get(episode, 0) for episode in episodes) if static and costs else None,
+            cost_unit=self.cost_unit,
+        )
 
     def run(self, data=None, rank: int = 0, world_size: int = 1):
         import logging
@@ -177,38 +712,157 @@ class ConvertHDF5Shards(PipelineStep):
         disable_progress_bars()
 
         # 生成 shard repo_id
-        shard_repo_id = f"{self.repo_id}_world_{world_size}_rank_{rank}"
+        shard_repo_id = shard_repo_id_for(self.repo_id, world_size, rank)
 
         logging.info(f"Worker {rank}/{world_size}: Processing shard '{shard_repo_id}'")
 
-        # 分配文件
-        files_to_process = self._allocate_files_by_rank(rank, world_size)
-        logging.info(f"Worker {rank}: Assigned {len(files_to_process)} files")
+        # 断点续转：重新打开已有 shard 并跳过已提交的 episodes
+        dataset, committed = self._resume_shard(shard_repo_id, rank) if self.resume else (None, [])
+        committed_episodes = set(committed)
 
-        if not files_to_process:
-            logging.warning(f"Worker {rank}: No files assigned, skipping")
-            return
+        # 分配 episodes
+        if self.work_queue_dir is not None:
+            # 动态调度：从共享队列中逐个领取 episode
+            episodes = (
+                episode for episode in EpisodeWorkQueue(self.work_queue_dir) if canonical_episode(*episode) not in committed_episodes
+            )
+            first_episode = next(episodes, None)
+            if first_episode is None:
+                logging.warning(f"Worker {rank}: Work queue is empty, skipping")
+                if self.status_dir:
+                    self._rank_status(rank, world_size, shard_repo_id, None).finish("done")
+                return
+            episodes = itertools.chain([first_episode], episodes)
+            logging.info(f"Worker {rank}: Pulling episodes from work queue {self.work_queue_dir}")
+        else:
+            episodes = self._allocate_episodes_by_rank(rank, world_size)
+            num_files = len({hdf5_file for hdf5_file, _ in episodes})
+            logging.info(f"Worker {rank}: Assigned {len(episodes)} episodes from {num_files} files")
+            if committed_episodes:
+                episodes = [episode for episode in episodes if canonical_episode(*episode) not in committed_episodes]
+                logging.info(f"Worker {rank}: Skipping {len(committed_episodes)} committed episodes, {len(episodes)} remaining")
+
+            if not episodes:
+                logging.warning(f"Worker {rank}: No episodes assigned, skipping")
+                if self.status_dir:
+                    self._rank_status(rank, world_size, shard_repo_id, episodes).finish("done")
+                return
 
         # 创建 shard dataset
-        dataset = LeRobotDataset.create(
-            repo_id=shard_repo_id,
-            fps=self.fps,
-            robot_type=self.robot_type,
-            features=BI_PIPER_FEATURES,
-        )
+        if dataset is None:
+            dataset = BiPiperDataset.create(
+                repo_id=shard_repo_id,
+                fps=self.fps // self.frame_stride,
+                robot_type=self.robot_type,
+                features=build_features(self.video_profile, self.target_resolution, self.fps // self.frame_stride),
+            )
+            dataset.configure_encoding(
+                self.video_profile, self.encode_workers, self.encode_cpus, self.stream_video, self.jpeg_passthrough
+            )
+        manifest = ShardManifest(dataset.root)
 
-        # 处理分配的文件
+        # 处理分配的 episodes
+        timer = StageTimer() if self.timing_dir else None
+        dataset.timer = timer
+        decoder = FrameDecoder(num_threads=self.decode_threads, resolution=self.target_resolution, timer=timer)
+        buffers = ReadBuffers(read_buffer_slots(decoder, self.read_window, frame_stride=self.frame_stride), timer)
+        cache = DecodedFrameCache(self.frame_cache_dir, self.frame_cache_bytes) if self.frame_cache_dir else None
+        costs = self._episode_costs() if self.episode_costs is not None else {}
+        status = self._rank_status(rank, world_size, shard_repo_id, episodes)
+        profiler = None
+        if self.profile_dir:
+            profiler = RankProfiler(Path(self.profile_dir) / f"rank_{rank:05d}", self.profile_episodes)
+            profiler.start()
         total_episodes = 0
-        for hdf5_file in files_to_process:
-            logging.info(f"Worker {rank}: Processing {hdf5_file}")
-            with h5py.File(hdf5_file, "r") as f:
-                for episode_name in f.keys():
-                    episode_group = f[episode_name]
-                    process_data(dataset, episode_group, episode_name)
+        processed_files = set()
+        try:
+            if self.prefetch_depth > 0:
+                # 流水线模式：后台线程读取解码下一个 episode，与当前 episode 的编码重叠
+                current_file = None
+                with EpisodePrefetcher(
+                    episodes,
+                    decoder,
+                    self.read_window,
+                    self.prefetch_depth,
+                    self.jpeg_passthrough,
+                    self.frame_stride,
+                    self.stride_reduce,
+                    cache,
+                    timer,
+                ) as prefetcher:
+                    for hdf5_file, episode_name, length, episode in prefetcher:
+                        if hdf5_file != current_file:
+                            logging.info(f"Worker {rank}: Processing {hdf5_file}")
+                            current_file = hdf5_file
+                            processed_files.add(hdf5_file)
+                        if status is not None:
+                            status.start_episode(hdf5_file, episode_name)
+                        dataset.begin_episode(length)
+                        dataset.add_episode_arrays(**episode)
+                        logging.info(f"Processed episode '{episode_name}' with {length} frames")
+                        with timed(timer, "metadata"):
+                            manifest.append(dataset.meta.total_episodes, hdf5_file, episode_name)
+                        dataset.save_episode()
+                        if timer is not None:
+                            timer.end_episode(hdf5_file, episode_name)
+                        if status is not None:
+                            status.end_episode(length, prefetcher.episode_nbytes, costs.get((hdf5_file, episode_name), 0))
+                        if profiler is not None:
+                            profiler.end_episode()
+                        total_episodes += 1
+            else:
+                current_file = None
+                for hdf5_file, episode_name, episode_group in iter_episode_groups(episodes):
+                    if hdf5_file != current_file:
+                        logging.info(f"Worker {rank}: Processing {hdf5_file}")
+                        current_file = hdf5_file
+                        processed_files.add(hdf5_file)
+                    if status is not None:
+                        status.start_episode(hdf5_file, episode_name)
+                    process_data(
+                        dataset,
+                        episode_group,
+                        episode_name,
+                        decoder=decoder,
+                        read_window=self.read_window,
+                        frame_stride=self.frame_stride,
+                        stride_reduce=self.stride_reduce,
+                        buffers=buffers,
+                        cache=cache,
+                    )
+                    num_frames = dataset.episode_buffer["size"]
+                    with timed(timer, "metadata"):
+                        manifest.append(dataset.meta.total_episodes, hdf5_file, episode_name)
                     dataset.save_episode()
+                    if timer is not None:
+                        timer.end_episode(hdf5_file, episode_name)
+                    if status is not None:
+                        status.end_episode(
+                            num_frames,
+                            episode_storage_size(episode_group),
+                            costs.get((hdf5_file, episode_name), 0),
+                        )
+                    if profiler is not None:
+                        profiler.end_episode()
                     total_episodes += 1
+        except BaseException:
+            if status is not None:
+                status.finish("failed")
+            raise
+        else:
+            if status is not None:
+                status.finish("done")
+        finally:
+            decoder.close()
+            # 写出 parquet footer 和缓冲的 episode 元数据；转换失败时 shard 仍可以重新打开续转
+            dataset.finalize()
+            if timer is not None:
+                # 每个 rank 的计时结果写在 datatrove 日志旁边，由 merge_stage_timing.py 汇总
+                timer.write(Path(self.timing_dir) / f"rank_{rank:05d}", rank=rank, shard=shard_repo_id)
+            if profiler is not None:
+                profiler.stop()
 
-        logging.info(f"Worker {rank}: Completed processing {total_episodes} episodes from {len(files_to_process)} files")
+        logging.info(f"Worker {rank}: Completed processing {total_episodes} episodes from {len(processed_files)} files")
 
 
 def make_convert_executor(
@@ -222,9 +876,73 @@ def make_convert_executor(
     partition,
     cpus_per_task,
     mem_per_cpu,
+    decode_threads=None,
+    read_window=DEFAULT_READ_WINDOW,
+    prefetch_depth=0,
+    episode_costs=None,
+    cost_unit="frames",
+    schedule="static",
+    resume=False,
+    video_profile=DEFAULT_VIDEO_PROFILE,
+    encode_workers=None,
+    stream_video=False,
+    jpeg_passthrough=False,
+    target_resolution=None,
+    frame_stride=1,
+    stride_reduce="sample",
+    frame_cache_dir=None,
+    frame_cache_gb=DEFAULT_FRAME_CACHE_GB,
+    status_interval=DEFAULT_STATUS_INTERVAL,
+    profile=False,
+    profile_episodes=None,
     slurm=True,
 ):
     """创建并行转换 executor"""
+    if decode_threads is None:
+        if slurm:
+            # 默认用满每个 task 预留的 CPU
+            decode_threads = cpus_per_task
+        else:
+            # 本地运行时所有 worker 共用本机的 CPU，平均分配，避免线程数远超核数
+            decode_threads = max(1, (os.cpu_count() or 1) // workers)
+    if encode_workers is None:
+        # 默认每个相机一个编码器，不超过每个 task 预留的 CPU 数
+        encode_workers = min(len(CAMERA_DATASETS), cpus_per_task)
+
+    # 续转时所有 shard 中已经提交的 episodes 不再计入本次任务
+    committed = set()
+    if resume:
+        for rank in range(workers):
+            shard_root = HF_LEROBOT_HOME / shard_repo_id_for(repo_id, workers, rank)
+            committed.update(ShardManifest(shard_root).load())
+    pending_costs = {
+        episode: cost for episode, cost in episode_costs.items() if canonical_episode(*episode) not in committed
+    }
+
+    work_queue_dir = None
+    rank_costs = None
+    if schedule == "dynamic":
+        if slurm:
+            raise ValueError("Dynamic scheduling is only supported for local execution (--slurm 0)")
+        # datatrove 会跳过已经完成的 rank，但重建的队列包含全部 episodes，
+        # 不续转时其余 rank 会把已完成 rank 转换过的 episodes 再转换一遍，写进不同的 shard
+        completions_dir = logs_dir / job_name / "completions"
+        if not resume and completions_dir.is_dir() and any(completions_dir.iterdir()):
+            raise ValueError(
+                f"Job '{job_name}' already has completed ranks in {completions_dir}; "
+                "rerun with --resume to convert only the remaining episodes, or use a new --job-name"
+            )
+        # 按代价从大到小入队，长 episode 先被领取，减少尾部拖延；跳过已经提交的 episodes
+        queue_episodes = sorted(pending_costs, key=lambda episode: (-pending_costs[episode], episode))
+        work_queue_dir = str(logs_dir / job_name / "work_queue")
+        EpisodeWorkQueue.create(work_queue_dir, queue_episodes)
+    else:
+        # 与各 rank 的 LPT 分配一致，rank 尚未启动时用于估计剩余时间
+        rank_costs = [
+            sum(pending_costs.get(episode, 0) for episode in episodes)
+            for episodes in lpt_schedule(episode_costs, workers)
+        ]
+    write_job_status(logs_dir / job_name / "status", job_name, workers, schedule, pending_costs, cost_unit, rank_costs)
     kwargs = {
         "pipeline": [
             ConvertHDF5Shards(
@@ -232,12 +950,38 @@ def make_convert_executor(
                 repo_id=repo_id,
                 robot_type=robot_type,
                 fps=fps,
+                decode_threads=decode_threads,
+                read_window=read_window,
+                prefetch_depth=prefetch_depth,
+                episode_costs=episode_costs,
+                cost_unit=cost_unit,
+                work_queue_dir=work_queue_dir,
+                resume=resume,
+                video_profile=video_profile,
+                encode_workers=encode_workers,
+                encode_cpus=cpus_per_task,
+                stream_video=stream_video,
+                jpeg_passthrough=jpeg_passthrough,
+                target_resolution=target_resolution,
+                frame_stride=frame_stride,
+                stride_reduce=stride_reduce,
+                frame_cache_dir=str(frame_cache_dir) if frame_cache_dir else None,
+                frame_cache_bytes=int(frame_cache_gb * 1024**3),
+                timing_dir=str(logs_dir / job_name / "stage_timing"),
+                status_dir=str(logs_dir / job_name / "status"),
+                status_interval=status_interval,
+                profile_dir=str(logs_dir / job_name / "profile") if profile else None,
+                profile_episodes=profile_episodes,
             ),
         ],
         "logging_dir": str(logs_dir / job_name),
     }
 
     if slurm:
+        # slurm 任务在提交目录下反序列化 pipeline，需要能导入与本脚本同目录的 hdf5_conversion；
+        # sbatch 默认继承提交时的环境变量
+        module_dir = str(Path(__file__).resolve().parent)
+        os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [module_dir, os.environ.get("PYTHONPATH")]))
         kwargs.update(
             {
                 "job_name": job_name,
@@ -263,8 +1007,13 @@ def make_convert_executor(
 
 
 def main():
+    # status 子命令只读取状态文件，不启动转换
+    if sys.argv[1:2] == ["status"]:
+        return status_main(sys.argv[2:])
+
     parser = argparse.ArgumentParser(
-        description="并行转换 HDF5 文件到 LeRobot Dataset"
+        description="并行转换 HDF5 文件到 LeRobot Dataset",
+        epilog="Run 'convert_hdf5_shards.py status --help' to monitor a running conversion",
     )
 
     parser.add_argument(
@@ -342,9 +1091,128 @@ def main():
         default="4000M",
         help="Memory per CPU (e.g., '4000M')",
     )
+    parser.add_argument(
+        "--decode-threads",
+        type=int,
+        default=None,
+        help="Number of JPEG decode threads per worker (default: --cpus-per-task on slurm, CPU count / --workers locally)",
+    )
+    parser.add_argument(
+        "--read-window",
+        type=int,
+        default=DEFAULT_READ_WINDOW,
+        help="Frames read from HDF5 per window, rounded up to the chunk size",
+    )
+    parser.add_argument(
+        "--prefetch-depth",
+        type=int,
+        default=0,
+        help="Decoded frame batches to prefetch while the previous episode is encoded (0 disables pipelining)",
+    )
+    parser.add_argument(
+        "--schedule",
+        choices=["static", "dynamic"],
+        default="static",
+        help="static: LPT assignment per rank up front; dynamic: local workers pull episodes from a shared queue",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Reopen existing shards and skip episodes already recorded in their manifest",
+    )
+    parser.add_argument(
+        "--video-profile",
+        choices=sorted(VIDEO_PROFILES),
+        default=DEFAULT_VIDEO_PROFILE,
+        help="Video encoding profile: fast (h264) or balanced (hevc) through the ffmpeg CLI, or archival (av1, LeRobot's built-in encoder)",
+    )
+    parser.add_argument(
+        "--encode-workers",
+        type=int,
+        default=None,
+        help="Camera videos encoded concurrently per episode (default: min(3, --cpus-per-task))",
+    )
+    parser.add_argument(
+        "--stream-video",
+        action="store_true",
+        help="Pipe decoded frames straight into one ffmpeg encoder per camera instead of temporary PNG files",
+    )
+    parser.add_argument(
+        "--jpeg-passthrough",
+        action="store_true",
+        help="Feed the stored JPEG bytes to the encoder as MJPEG input and only decode frames sampled for stats (implies --stream-video)",
+    )
+    parser.add_argument(
+        "--target-resolution",
+        type=parse_resolution,
+        default=None,
+        help="Store camera frames at HEIGHTxWIDTH (e.g. 240x320) using reduced JPEG decode and resize (default: source resolution)",
+    )
+    parser.add_argument(
+        "--target-fps",
+        type=int,
+        default=None,
+        help="Write the dataset at this fps by keeping every (fps / target-fps)-th frame; must divide --fps",
+    )
+    parser.add_argument(
+        "--frame-stride",
+        type=int,
+        default=None,
+        help="Keep every N-th frame and write the dataset at fps / N (alternative to --target-fps)",
+    )
+    parser.add_argument(
+        "--stride-reduce",
+        choices=STRIDE_REDUCTIONS,
+        default="sample",
+        help="How action/state are reduced over each stride window: first frame (sample) or average (mean)",
+    )
+    parser.add_argument(
+        "--frame-cache-dir",
+        type=Path,
+        default=None,
+        help="Directory for the on-disk decoded frame cache shared by all workers (default: disabled)",
+    )
+    parser.add_argument(
+        "--frame-cache-gb",
+        type=float,
+        default=DEFAULT_FRAME_CACHE_GB,
+        help="Size cap of the decoded frame cache in GB, least recently used episodes are evicted first",
+    )
+    parser.add_argument(
+        "--status-interval",
+        type=float,
+        default=DEFAULT_STATUS_INTERVAL,
+        help="Minimum seconds between per-rank status file updates read by the status subcommand",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile each rank and write rank_XXXXX.pstats/.collapsed to <logs-dir>/<job-name>/profile",
+    )
+    parser.add_argument(
+        "--profile-episodes",
+        type=int,
+        default=None,
+        help="Only profile the first N episodes of each rank (default: all)",
+    )
 
     args = parser.parse_args()
 
+    try:
+        frame_stride = resolve_frame_stride(args.fps, args.target_fps, args.frame_stride)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    if args.profile_episodes is not None and args.profile_episodes < 1:
+        print("Error: --profile-episodes must be at least 1")
+        return 1
+    if requires_ffmpeg_cli(args.video_profile, args.stream_video or args.jpeg_passthrough):
+        try:
+            check_ffmpeg_encoder(VIDEO_PROFILES[args.video_profile]["vcodec"])
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            return 1
+
     # Handle file selection
     hdf5_root = Path(args.hdf5_root)
     if args.all:
@@ -361,6 +1229,23 @@ def main():
         print("Error: No HDF5 files found to process")
         return 1
 
+    # Predict per-rank load before submission so stragglers are visible up front
+    episode_costs, cost_unit = estimate_episode_costs(hdf5_files)
+    if not episode_costs:
+        print("Error: No episodes found in the HDF5 files")
+        return 1
+    if len(episode_costs) < args.workers:
+        print(f"Warning: Only {len(episode_costs)} episodes for {args.workers} workers, some workers will be idle")
+    if args.schedule == "dynamic":
+        if args.slurm == 1:
+            print("Error: --schedule dynamic is only supported with --slurm 0")
+            return 1
+        print(f"Dynamic schedule: {len(episode_costs)} episodes in a shared queue for {args.workers} workers")
+    else:
+        print(f"Predicted schedule for {args.workers} workers (LPT by {cost_unit}):")
+        for line in format_schedule(lpt_schedule(episode_costs, args.workers), episode_costs, cost_unit):
+            print(f"  {line}")
+
     # Create logs directory
     args.logs_dir.mkdir(parents=True, exist_ok=True)
 
@@ -376,16 +1261,44 @@ def main():
         "partition": args.partition,
         "cpus_per_task": args.cpus_per_task,
         "mem_per_cpu": args.mem_per_cpu,
+        "decode_threads": args.decode_threads,
+        "read_window": args.read_window,
+        "prefetch_depth": args.prefetch_depth,
+        "episode_costs": episode_costs,
+        "cost_unit": cost_unit,
+        "schedule": args.schedule,
+        "resume": args.resume,
+        "video_profile": args.video_profile,
+        "encode_workers": args.encode_workers,
+        "stream_video": args.stream_video,
+        "jpeg_passthrough": args.jpeg_passthrough,
+        "target_resolution": args.target_resolution,
+        "frame_stride": frame_stride,
+        "stride_reduce": args.stride_reduce,
+        "frame_cache_dir": args.frame_cache_dir,
+        "frame_cache_gb": args.frame_cache_gb,
+        "status_interval": args.status_interval,
+        "profile": args.profile,
+        "profile_episodes": args.profile_episodes,
         "slurm": args.slurm == 1,
     }
 
-    executor = make_convert_executor(**kwargs)
+    try:
+        executor = make_convert_executor(**kwargs)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
     executor.run()
 
     print(f"\n✨ Conversion complete!")
     print(f"Generated {args.workers} shards:")
     for i in range(args.workers):
-        print(f"  - {args.repo_id}_world_{args.workers}_rank_{i}")
+        print(f"  - {shard_repo_id_for(args.repo_id, args.workers, i)}")
+    print(f"\nStage timing per rank: {args.logs_dir / args.job_name / 'stage_timing'}")
+    print(f"Merge with: python convert_parallel/merge_stage_timing.py --timing-dir {args.logs_dir / args.job_name / 'stage_timing'}")
+    print(f"Progress: python convert_parallel/convert_hdf5_shards.py status --logs-dir {args.logs_dir} --job-name {args.job_name}")
+    if args.profile:
+        print(f"Profiles per rank: {args.logs_dir / args.job_name / 'profile'}")
     print(f"\nNext step: Aggregate shards using aggregate_hdf5_shards.py")
     print(f"Example: python convert_parallel/aggregate_hdf5_shards.py --repo-id {args.repo_id} --num-shards {args.workers}")
 
@@ -0,0 +1,1650 @@
+"""
+HDF5 转换为 LeRobot Dataset 的共用组件
+hdf2lerobotv21.py 与 convert_hdf5_shards.py 共用这里的读取、解码、编码和 BiPiperDataset，
+两个脚本只保留各自的命令行与调度逻辑
+"""
+
+import contextlib
+import copy
+import cProfile
+import csv
+import hashlib
+import itertools
+import json
+import math
+import operator
+import os
+import queue
+import resource
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import cv2
+import h5py
+import numpy as np
+from lerobot.datasets.compute_stats import sample_indices
+from lerobot.datasets.lerobot_dataset import LeRobotDataset
+from lerobot.datasets.video_utils import encode_video_frames
+
+
+# feature definition for bi-arm piper data
+BI_PIPER_FEATURES = {
+    "action": {
+        "dtype": "float32",
+        "shape": (14,),
+        "names": [
+            "left_joint_1.pos",
+            "left_joint_2.pos",
+            "left_joint_3.pos",
+            "left_joint_4.pos",
+            "left_joint_5.pos",
+            "left_joint_6.pos",
+            "left_joint_7.pos",
+            "right_joint_1.pos",
+            "right_joint_2.pos",
+            "right_joint_3.pos",
+            "right_joint_4.pos",
+            "right_joint_5.pos",
+            "right_joint_6.pos",
+            "right_joint_7.pos",
+        ],
+    },
+    "observation.state": {
+        "dtype": "float32",
+        "shape": (14,),
+        "names": [
+            "left_joint_1.pos",
+            "left_joint_2.pos",
+            "left_joint_3.pos",
+            "left_joint_4.pos",
+            "left_joint_5.pos",
+            "left_joint_6.pos",
+            "left_joint_7.pos",
+            "right_joint_1.pos",
+            "right_joint_2.pos",
+            "right_joint_3.pos",
+            "right_joint_4.pos",
+            "right_joint_5.pos",
+            "right_joint_6.pos",
+            "right_joint_7.pos",
+        ],
+    },
+    "observation.images.left_wrist": {
+        "dtype": "video",
+        "shape": [480, 640, 3],
+        "names": ["height", "width", "channels"],
+        "video_info": {
+            "video.height": 480,
+            "video.width": 640,
+            "video.codec": "av1",
+            "video.pix_fmt": "yuv420p",
+            "video.is_depth_map": False,
+            "video.fps": 30.0,
+            "video.channels": 3,
+            "has_audio": False,
+        },
+    },
+    "observation.images.mid": {
+        "dtype": "video",
+        "shape": [480, 640, 3],
+        "names": ["height", "width", "channels"],
+        "video_info": {
+            "video.height": 480,
+            "video.width": 640,
+            "video.codec": "av1",
+            "video.pix_fmt": "yuv420p",
+            "video.is_depth_map": False,
+            "video.fps": 30.0,
+            "video.channels": 3,
+            "has_audio": False,
+        },
+    },
+    "observation.images.right_wrist": {
+        "dtype": "video",
+        "shape": [480, 640, 3],
+        "names": ["height", "width", "channels"],
+        "video_info": {
+            "video.height": 480,
+            "video.width": 640,
+            "video.codec": "av1",
+            "video.pix_fmt": "yuv420p",
+            "video.is_depth_map": False,
+            "video.fps": 30.0,
+            "video.channels": 3,
+            "has_audio": False,
+        },
+    },
+}
+
+
+# 每次从 HDF5 读取的帧数（会向上对齐到 chunk 长度）
+DEFAULT_READ_WINDOW = 32
+
+# 抽帧时 action/state 的取值方式：sample 取每个窗口的第一帧，mean 取窗口内的平均值
+STRIDE_REDUCTIONS = ("sample", "mean")
+
+# 解码帧磁盘缓存的默认大小上限（GB）
+DEFAULT_FRAME_CACHE_GB = 100
+
+# frame 中携带各相机原始 JPEG 字节的键，由 BiPiperDataset.add_frame 取出后送入编码器
+ENCODED_FRAMES_KEY = "_encoded_images"
+
+# 视频编码配置：codec、CRF、preset、GOP 与编码线程数（0 表示由编码器自行决定）
+# 默认的 archival 与 LeRobot 自带的编码参数一致，由 LeRobotDataset 编码；其余配置通过 ffmpeg 命令行编码
+VIDEO_PROFILES = {
+    "fast": {
+        "vcodec": "libx264",
+        "codec": "h264",
+        "pix_fmt": "yuv420p",
+        "crf": 23,
+        "preset": "veryfast",
+        "g": 2,
+        "threads": 0,
+    },
+    "balanced": {
+        "vcodec": "libx265",
+        "codec": "hevc",
+        "pix_fmt": "yuv420p",
+        "crf": 28,
+        "preset": "fast",
+        "g": 2,
+        "threads": 0,
+    },
+    "archival": {
+        "vcodec": "libsvtav1",
+        "codec": "av1",
+        "pix_fmt": "yuv420p",
+        "crf": 30,
+        "preset": None,
+        "g": 2,
+        "threads": 0,
+    },
+}
+DEFAULT_VIDEO_PROFILE = "archival"
+
+
+def build_features(
+    video_profile: str = DEFAULT_VIDEO_PROFILE,
+    resolution: Optional[Tuple[int, int]] = None,
+    fps: Optional[int] = None,
+) -> dict:
+    """根据视频编码配置、目标分辨率 (height, width) 和输出帧率生成 feature 定义"""
+    features = copy.deepcopy(BI_PIPER_FEATURES)
+    profile = VIDEO_PROFILES[video_profile]
+    for feature in features.values():
+        if feature["dtype"] == "video":
+            feature["video_info"]["video.codec"] = profile["codec"]
+            feature["video_info"]["video.pix_fmt"] = profile["pix_fmt"]
+            if fps is not None:
+                feature["video_info"]["video.fps"] = float(fps)
+            if resolution is not None:
+                height, width = resolution
+                feature["shape"] = [height, width, feature["shape"][2]]
+                feature["video_info"]["video.height"] = height
+                feature["video_info"]["video.width"] = width
+    return features
+
+
+def parse_resolution(value: str) -> Tuple[int, int]:
+    """解析 "HEIGHTxWIDTH" 形式的分辨率，例如 "240x320" """
+    height, width = (int(x) for x in value.lower().split("x"))
+    if height <= 0 or width <= 0:
+        raise ValueError(f"Invalid resolution: {value}")
+    return height, width
+
+
+def ffmpeg_encode_args(profile: dict) -> List[str]:
+    """生成与编码配置对应的 ffmpeg 输出参数"""
+    args = ["-c:v", profile["vcodec"], "-pix_fmt", profile["pix_fmt"], "-g", str(profile["g"]), "-crf", str(profile["crf"])]
+    if profile["preset"] is not None:
+        args += ["-preset", str(profile["preset"])]
+    if profile["threads"]:
+        args += ["-threads", str(profile["threads"])]
+    return args
+
+
+def encode_video_with_profile(img_dir: Path, video_path: Path, fps: float, profile: dict) -> None:
+    """使用 ffmpeg 按编码配置将 img_dir 中按帧序号命名的 PNG 编码为 mp4"""
+    video_path.parent.mkdir(parents=True, exist_ok=True)
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-framerate",
+        str(fps),
+        "-pattern_type",
+        "glob",
+        "-i",
+        str(Path(img_dir) / "*.png"),
+        *ffmpeg_encode_args(profile),
+        "-y",
+        str(video_path),
+    ]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
+    except FileNotFoundError as exc:
+        raise RuntimeError("ffmpeg executable not found; it is required for video encoding") from exc
+    except subprocess.CalledProcessError as exc:
+        error_msg = f"ffmpeg failed while encoding '{img_dir}' into '{video_path}'"
+        if exc.stderr:
+            error_msg += f". Error: {exc.stderr.strip()}"
+        raise RuntimeError(error_msg) from exc
+
+
+def requires_ffmpeg_cli(video_profile: str, stream_video: bool = False) -> bool:
+    """是否需要通过 ffmpeg 命令行编码：显式选择了非默认配置，或使用管道模式"""
+    return video_profile != DEFAULT_VIDEO_PROFILE or stream_video
+
+
+def check_ffmpeg_encoder(vcodec: str) -> None:
+    """确认 PATH 中有 ffmpeg 且支持 vcodec 编码器，否则报错说明原因"""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError(
+            f"ffmpeg executable not found on PATH; it is required for video profiles other than "
+            f"'{DEFAULT_VIDEO_PROFILE}' and for --stream-video / --jpeg-passthrough"
+        )
+    result = subprocess.run([ffmpeg, "-hide_banner", "-encoders"], capture_output=True, text=True)
+    if not any(line.split()[1:2] == [vcodec] for line in result.stdout.splitlines()):
+        raise RuntimeError(f"ffmpeg at '{ffmpeg}' does not support the '{vcodec}' encoder, choose another video profile")
+
+
+class StageTimer:
+    """
+    转换流水线的分阶段计时
+    记录每个阶段的墙钟时间、CPU 时间、字节数和帧数，并按 episode 汇总
+
+    同一线程内嵌套的阶段只计入最内层（外层在内层执行期间暂停计时），因此主线程上各阶段的时间互不重叠；
+    解码线程池和预取线程中的阶段与主线程并行执行，其时间是这些线程的忙碌时间；
+    encode 阶段的 CPU 时间包含 ffmpeg 子进程
+    """
+
+    STAGES = ("read", "decode", "decode_wait", "prefetch_wait", "add_frame", "encode", "metadata")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.totals = {stage: self._empty() for stage in self.STAGES}
+        self.episodes: List[dict] = []
+        self._start = time.perf_counter()
+        self._episode_start = self._start
+        self._episode_totals = copy.deepcopy(self.totals)
+
+    @staticmethod
+    def _empty() -> dict:
+        return {"wall_s": 0.0, "cpu_s": 0.0, "bytes": 0, "frames": 0}
+
+    @staticmethod
+    def _children_cpu() -> float:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+
+    def _accumulate(self, entry: list, wall: float, cpu: float):
+        name, wall_start, cpu_start = entry
+        with self._lock:
+            totals = self.totals[name]
+            totals["wall_s"] += wall - wall_start
+            totals["cpu_s"] += cpu - cpu_start
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        stack = self._local.__dict__.setdefault("stack", [])
+        wall, cpu = time.perf_counter(), time.thread_time()
+        if stack:
+            # 暂停外层阶段
+            self._accumulate(stack[-1], wall, cpu)
+        entry = [name, wall, cpu]
+        stack.append(entry)
+        children_cpu = self._children_cpu() if name == "encode" else None
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter(), time.thread_time()
+            stack.pop()
+            self._accumulate(entry, wall, cpu)
+            if children_cpu is not None:
+                with self._lock:
+                    self.totals[name]["cpu_s"] += self._children_cpu() - children_cpu
+            if stack:
+                stack[-1][1], stack[-1][2] = wall, cpu
+
+    def count(self, name: str, nbytes: int = 0, frames: int = 0):
+        with self._lock:
+            self.totals[name]["bytes"] += int(nbytes)
+            self.totals[name]["frames"] += int(frames)
+
+    def end_episode(self, hdf5_file: str, episode_name: str):
+        """记录自上一个 episode 结束以来各阶段的增量"""
+        now = time.perf_counter()
+        with self._lock:
+            record = {"hdf5_file": hdf5_file, "episode": episode_name, "elapsed_s": now - self._episode_start}
+            for stage, totals in self.totals.items():
+                previous = self._episode_totals[stage]
+                for field, value in totals.items():
+                    record[f"{stage}_{field}"] = value - previous[field]
+            self._episode_totals = copy.deepcopy(self.totals)
+        self._episode_start = now
+        self.episodes.append(record)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "elapsed_s": time.perf_counter() - self._start,
+                "episodes": len(self.episodes),
+                "stages": copy.deepcopy(self.totals),
+            }
+
+    def write(self, path_prefix: Path, **extra):
+        """写出 <path_prefix>.json（汇总与逐 episode 记录）和 <path_prefix>.csv（逐 episode 记录）"""
+        path_prefix = Path(path_prefix)
+        path_prefix.parent.mkdir(parents=True, exist_ok=True)
+        report = {**extra, **self.summary(), "per_episode": self.episodes}
+        with open(path_prefix.with_suffix(".json"), "w") as f:
+            json.dump(report, f, indent=2)
+        with open(path_prefix.with_suffix(".csv"), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=timing_csv_fields())
+            writer.writeheader()
+            writer.writerows(self.episodes)
+
+
+def timing_csv_fields() -> List[str]:
+    fields = ["hdf5_file", "episode", "elapsed_s"]
+    for stage in StageTimer.STAGES:
+        fields += [f"{stage}_{field}" for field in StageTimer._empty()]
+    return fields
+
+
+def timed(timer: Optional[StageTimer], name: str):
+    """timer 为 None 时不计时"""
+    return timer.stage(name) if timer is not None else contextlib.nullcontext()
+
+
+class RankProfiler:
+    """
+    分析单个 rank 的转换过程，写出 <path_prefix>.pstats 和 <path_prefix>.collapsed
+
+    cProfile 对主线程做确定性分析，结果可用 pstats / snakeviz 查看；
+    后台线程每隔 interval 秒通过 sys._current_frames 采样所有线程（包括解码和预取线程）的调用栈，
+    写成 flamegraph.pl / speedscope 可读的折叠栈格式（每行 "线程;外层函数;...;内层函数 样本数"）。
+    max_episodes 不为 None 时只分析前 max_episodes 个 episode，之后停止分析并写出结果，限制额外开销
+    """
+
+    def __init__(self, path_prefix: Path, max_episodes: Optional[int] = None, interval: float = 0.005):
+        self.path_prefix = Path(path_prefix)
+        self.max_episodes = max_episodes
+        self.interval = interval
+        self.episodes = 0
+        self.samples: Dict[str, int] = {}
+        self._profile = cProfile.Profile()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="rank-profiler", daemon=True)
+        self._running = False
+
+    def start(self):
+        self._running = True
+        self._thread.start()
+        self._profile.enable()
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                key = ";".join(reversed(stack))
+                self.samples[key] = self.samples.get(key, 0) + 1
+
+    def end_episode(self):
+        self.episodes += 1
+        if self.max_episodes is not None and self.episodes >= self.max_episodes:
+            self.stop()
+
+    def stop(self):
+        """停止分析并写出结果，重复调用不会覆盖已写出的结果"""
+        if not self._running:
+            return
+        self._running = False
+        self._profile.disable()
+        self._stop.set()
+        self._thread.join()
+        self.path_prefix.parent.mkdir(parents=True, exist_ok=True)
+        self._profile.dump_stats(str(self.path_prefix.with_suffix(".pstats")))
+        with open(self.path_prefix.with_suffix(".collapsed"), "w") as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+
+
+# JPEG 直通时交换 R/B 通道：与 cv2 解码成 BGR 后原样写入数据集的像素路径保持一致
+MJPEG_CHANNEL_FILTERS = ["format=gbrp", "shuffleplanes=0:2:1"]
+
+
+class FfmpegPipeEncoder:
+    """
+    通过 stdin 管道向 ffmpeg 持续写入帧的编码器
+    input_format 为 "rawvideo" 时写入解码后的 uint8 帧，为 "mjpeg" 时直接写入原始 JPEG 字节；
+    帧直接从内存送入编码器，省去逐帧临时 PNG 的写入和读回
+    """
+
+    def __init__(
+        self,
+        video_path: Path,
+        fps: float,
+        profile: dict,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        input_format: str = "rawvideo",
+    ):
+        self.video_path = Path(video_path)
+        self.video_path.parent.mkdir(parents=True, exist_ok=True)
+        self.input_format = input_format
+        if input_format == "rawvideo":
+            input_args = ["-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}"]
+            filters = []
+        elif input_format == "mjpeg":
+            input_args = ["-f", "mjpeg"]
+            filters = list(MJPEG_CHANNEL_FILTERS)
+            if width is not None and height is not None:
+                # 源图像尺寸与目标尺寸相同时 scale 不做任何处理
+                filters.append(f"scale={width}:{height}:flags=area")
+        else:
+            raise ValueError(f"Unsupported input format: {input_format}")
+        cmd = [
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            *input_args,
+            "-framerate",
+            str(fps),
+            "-i",
+            "pipe:0",
+            *(["-vf", ",".join(filters)] if filters else []),
+            *ffmpeg_encode_args(profile),
+            "-y",
+            str(self.video_path),
+        ]
+        self.frames_written = 0
+        self._stderr = tempfile.TemporaryFile()
+        try:
+            self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=self._stderr)
+        except FileNotFoundError as exc:
+            raise RuntimeError("ffmpeg executable not found; it is required for video encoding") from exc
+
+    def _error(self) -> str:
+        self._stderr.seek(0)
+        return self._stderr.read().decode(errors="replace").strip()
+
+    def write(self, data):
+        """写入一帧：rawvideo 为 (H, W, 3) uint8 数组，mjpeg 为 JPEG 字节"""
+        if isinstance(data, np.ndarray):
+            data = np.ascontiguousarray(data, dtype=np.uint8).data
+        try:
+            self.process.stdin.write(data)
+        except BrokenPipeError as exc:
+            self.process.wait()
+            raise RuntimeError(f"ffmpeg exited while encoding '{self.video_path}'. Error: {self._error()}") from exc
+        self.frames_written += 1
+
+    def close(self) -> Path:
+        """结束输入并等待编码完成"""
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed while encoding '{self.video_path}'. Error: {self._error()}")
+        self._stderr.close()
+        return self.video_path
+
+    def abort(self):
+        self.process.kill()
+        self.process.wait()
+        self._stderr.close()
+
+
+class BiPiperDataset(LeRobotDataset):
+    """
+    按 video_profile 编码视频的 LeRobotDataset
+    仅替换单个 episode 临时视频的编码步骤，目录结构与元数据仍由 LeRobotDataset 维护；
+    encode_workers > 1 时，save_episode 会同时编码各相机的视频（见 _pre_encode_videos），编码时间计入 encode 阶段；
+    stream_video 为 True 时，每个相机的帧在 add_frame 时直接写入 ffmpeg 管道，
+    只有计算统计量需要采样的帧才会写成 PNG；
+    jpeg_passthrough 为 True 时，frame 中 ENCODED_FRAMES_KEY 携带的原始 JPEG 字节直接作为 MJPEG 输入编码；
+    默认配置且不使用管道时，视频仍由 LeRobotDataset 自带的编码完成，只有显式选择的其他配置和管道模式调用 ffmpeg 命令行
+    """
+
+    video_profile: dict = VIDEO_PROFILES[DEFAULT_VIDEO_PROFILE]
+    use_ffmpeg_cli: bool = False
+    encode_workers: int = 1
+    stream_video: bool = False
+    jpeg_passthrough: bool = False
+    timer: Optional[StageTimer] = None
+    _pre_encoded: Optional[dict] = None
+    _streams: Optional[dict] = None
+    _stats_frames: Optional[set] = None
+
+    def configure_encoding(
+        self,
+        video_profile: str,
+        encode_workers: Optional[int] = None,
+        encode_cpus: int = 0,
+        stream_video: bool = False,
+        jpeg_passthrough: bool = False,
+    ):
+        """
+        设置视频编码方式
+
+        Args:
+            video_profile: VIDEO_PROFILES 中的配置名称
+            encode_workers: 同时编码的相机数，None 表示每个相机一个编码器
+            encode_cpus: 可用于编码的 CPU 数，配置未指定线程数时平均分给同时运行的编码器，0 表示不限制
+            stream_video: 是否通过管道把帧直接送入编码器
+            jpeg_passthrough: 是否把原始 JPEG 字节直接送入编码器（隐含 stream_video）
+
+        Raises:
+            RuntimeError: 需要 ffmpeg 命令行编码，但找不到 ffmpeg 或其不支持配置的编码器
+        """
+        profile = dict(VIDEO_PROFILES[video_profile])
+        self.jpeg_passthrough = jpeg_passthrough
+        stream_video = stream_video or jpeg_passthrough
+        self.stream_video = stream_video
+        self.use_ffmpeg_cli = requires_ffmpeg_cli(video_profile, stream_video)
+        if self.use_ffmpeg_cli:
+            # 在转换任何 episode 之前检查，避免第一个 episode 编码时才失败
+            check_ffmpeg_encoder(profile["vcodec"])
+        if stream_video or encode_workers is None:
+            self.encode_workers = len(self.meta.video_keys)
+        else:
+            self.encode_workers = max(1, encode_workers)
+        if encode_cpus and not profile["threads"]:
+            profile["threads"] = max(1, encode_cpus // max(1, self.encode_workers))
+        self.video_profile = profile
+
+    def begin_episode(self, length: int):
+        """
+        声明下一个 episode 的帧数
+        管道模式下只为 compute_episode_stats 会采样的帧写 PNG；未声明时写出所有帧
+        """
+        self._stats_frames = set(int(i) for i in sample_indices(length))
+
+    def _image_dir(self, video_key: str, episode_index: int) -> Path:
+        return self._get_image_file_path(episode_index, video_key, frame_index=0).parent
+
+    def _open_stream(
+        self,
+        video_key: str,
+        episode_index: int,
+        input_format: str,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+    ) -> FfmpegPipeEncoder:
+        temp_path = Path(tempfile.mkdtemp(dir=self.root)) / f"{video_key}_{episode_index:03d}.mp4"
+        stream = FfmpegPipeEncoder(temp_path, self.fps, self.video_profile, width, height, input_format)
+        if self._streams is None:
+            self._streams = {}
+        self._streams[video_key] = stream
+        return stream
+
+    def _write_encoded_images(self, encoded_images: Dict[str, Any]):
+        episode_index = self.episode_buffer["episode_index"]
+        for video_key, data in encoded_images.items():
+            stream = (self._streams or {}).get(video_key)
+            if stream is None:
+                height, width = self.features[video_key]["shape"][:2]
+                stream = self._open_stream(video_key, episode_index, "mjpeg", width, height)
+            stream.write(data)
+
+    def add_frame(self, frame: dict, *args, **kwargs):
+        with timed(self.timer, "add_frame"):
+            encoded_images = frame.pop(ENCODED_FRAMES_KEY, None)
+            if encoded_images is not None:
+                self._write_encoded_images(encoded_images)
+            super().add_frame(frame, *args, **kwargs)
+        if self.timer is not None:
+            self.timer.count("add_frame", frames=1)
+
+    def add_episode_arrays(
+        self,
+        action: np.ndarray,
+        state: np.ndarray,
+        images: Dict[str, Iterable[np.ndarray]],
+        task: str,
+        encoded_images: Optional[Dict[str, Iterable[Any]]] = None,
+    ):
+        """
+        一次写入整个 episode，代替逐帧构造 dict 调用 add_frame
+
+        action/state 为 (T, 14) 数组，直接作为整列放入 episode buffer，save_episode 时一次性写入 parquet；
+        images 为每个相机按帧顺序产出图像的迭代器，各相机按帧同步消费，逐帧交给 _save_image；
+        encoded_images 为 JPEG 直通时每个相机的原始字节迭代器
+        """
+        if self.episode_buffer is None:
+            self.episode_buffer = self.create_episode_buffer()
+        if self.episode_buffer["size"] != 0:
+            raise ValueError("add_episode_arrays() requires an empty episode buffer")
+
+        length = len(action)
+        columns = {"action": action, "observation.state": state}
+        for key, values in columns.items():
+            expected = (length, *self.features[key]["shape"])
+            if values.shape != expected:
+                raise ValueError(f"Feature '{key}' has shape {values.shape}, expected {expected}")
+            columns[key] = np.asarray(values, dtype=self.features[key]["dtype"])
+
+        buffer = self.episode_buffer
+        episode_index = buffer["episode_index"]
+        camera_keys = list(images)
+        unknown_keys = [key for key in camera_keys if key not in self.meta.camera_keys]
+        if unknown_keys:
+            raise ValueError(f"Unknown camera features {unknown_keys}, expected {self.meta.camera_keys}")
+        streams = [images[key] for key in camera_keys]
+        if encoded_images is not None:
+            streams += [encoded_images[key] for key in camera_keys]
+
+        num_frames = 0
+        # 读取和解码在迭代 streams 时按需发生，计入各自的阶段
+        with timed(self.timer, "add_frame"):
+            for frame_index, row in enumerate(zip(*streams)):
+                if frame_index >= length:
+                    raise ValueError(f"Got more than {length} frames for episode {episode_index}")
+                if encoded_images is not None:
+                    self._write_encoded_images(dict(zip(camera_keys, row[len(camera_keys) :])))
+                for key, image in zip(camera_keys, row):
+                    img_path = self._get_image_file_path(episode_index=episode_index, image_key=key, frame_index=frame_index)
+                    if frame_index == 0:
+                        # 与 add_frame 的 validate_frame 一样检查首帧，否则分辨率或类型不符要到编码时才会报错
+                        expected = tuple(self.features[key]["shape"])
+                        if image.shape != expected or image.dtype != np.uint8:
+                            raise ValueError(
+                                f"Feature '{key}' has {image.dtype} images of shape {image.shape}, expected uint8 {expected}"
+                            )
+                        img_path.parent.mkdir(parents=True, exist_ok=True)
+                    self._save_image(image, img_path)
+                    buffer[key].append(str(img_path))
+                num_frames += 1
+        if self.timer is not None:
+            self.timer.count("add_frame", frames=num_frames)
+        if num_frames != length:
+            raise ValueError(f"Got {num_frames} frames for episode {episode_index}, expected {length}")
+
+        buffer["frame_index"] = np.arange(length)
+        buffer["timestamp"] = np.arange(length) / self.fps
+        buffer["task"] = [task] * length
+        buffer.update(columns)
+        buffer["size"] = length
+
+    def _save_image(self, image, fpath, *args, **kwargs):
+        if not self.stream_video:
+            return super()._save_image(image, fpath, *args, **kwargs)
+
+        episode_index = self.episode_buffer["episode_index"]
+        video_key = next(
+            (key for key in self.meta.video_keys if Path(fpath).parent == self._image_dir(key, episode_index)),
+            None,
+        )
+        if video_key is None:
+            return super()._save_image(image, fpath, *args, **kwargs)
+
+        stream = (self._streams or {}).get(video_key)
+        if stream is None:
+            height, width = image.shape[:2]
+            stream = self._open_stream(video_key, episode_index, "rawvideo", width, height)
+        if stream.input_format == "rawvideo":
+            frame_index = stream.frames_written
+            stream.write(image)
+        else:
+            # JPEG 字节已经在 add_frame 中写入，这里的 image 只用于统计量
+            frame_index = stream.frames_written - 1
+
+        if self._stats_frames is None or frame_index in self._stats_frames:
+            super()._save_image(image, fpath, *args, **kwargs)
+
+    def _encode_episode_video(self, video_key: str, episode_index: int) -> Path:
+        """用 ffmpeg 命令行按编码配置编码单个相机的临时视频，保留 PNG 以便之后计算统计量"""
+        temp_path = self._temporary_video_path(video_key, episode_index)
+        encode_video_with_profile(self._image_dir(video_key, episode_index), temp_path, self.fps, self.video_profile)
+        return temp_path
+
+    def _temporary_video_path(self, video_key: str, episode_index: int) -> Path:
+        return Path(tempfile.mkdtemp(dir=self.root)) / f"{video_key}_{episode_index:03d}.mp4"
+
+    def _pre_encode_videos(self, episode_index: int) -> Dict[str, Path]:
+        """
+        同时编码所有相机的临时视频，保留 PNG 以便之后计算统计量
+        ffmpeg 命令行在子进程中编码，用线程池即可；默认配置使用 LeRobotDataset 的 encode_video_frames，
+        与其 parallel_encoding 一样放到进程池中
+        """
+        video_keys = self.meta.video_keys
+        max_workers = min(self.encode_workers, len(video_keys))
+        if self.use_ffmpeg_cli:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                futures = {key: pool.submit(self._encode_episode_video, key, episode_index) for key in video_keys}
+                return {key: future.result() for key, future in futures.items()}
+
+        encoder_threads = self.video_profile["threads"] or self._encoder_threads
+        temp_paths = {key: self._temporary_video_path(key, episode_index) for key in video_keys}
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                pool.submit(
+                    encode_video_frames,
+                    self._image_dir(key, episode_index),
+                    temp_path,
+                    self.fps,
+                    vcodec=self.vcodec,
+                    overwrite=True,
+                    encoder_threads=encoder_threads,
+                )
+                for key, temp_path in temp_paths.items()
+            ]
+            for future in futures:
+                future.result()
+        return temp_paths
+
+    def _finish_streams(self):
+        """关闭所有相机的管道；先全部结束输入再等待，让各编码器同时收尾"""
+        streams, self._streams = self._streams or {}, None
+        for stream in streams.values():
+            try:
+                stream.process.stdin.close()
+            except BrokenPipeError:
+                pass
+        self._pre_encoded = {key: stream.close() for key, stream in streams.items()}
+
+    def save_episode(self, episode_data: Optional[dict] = None) -> None:
+        # 编码以外的部分（统计量、parquet 和元数据写入）计入 metadata 阶段
+        with timed(self.timer, "metadata"):
+            self._save_episode(episode_data)
+
+    def _save_episode(self, episode_data: Optional[dict] = None) -> None:
+        video_keys = self.meta.video_keys
+        if self._streams:
+            with timed(self.timer, "encode"):
+                self._finish_streams()
+        elif episode_data is None and self.encode_workers > 1 and len(video_keys) > 1:
+            # 先并行编码所有相机，LeRobotDataset 随后逐个相机调用 _encode_temporary_episode_video 取用编码结果；
+            # 不使用 LeRobotDataset 自己的并行编码，它在进程池中直接编码，时间无法计入 encode 阶段
+            self._wait_image_writer()
+            with timed(self.timer, "encode"):
+                self._pre_encoded = self._pre_encode_videos(self.episode_buffer["episode_index"])
+        try:
+            super().save_episode(episode_data, parallel_encoding=False)
+        finally:
+            self._pre_encoded = None
+            self._stats_frames = None
+
+    def clear_episode_buffer(self, *args, **kwargs):
+        for stream in (self._streams or {}).values():
+            stream.abort()
+        self._streams = None
+        self._stats_frames = None
+        return super().clear_episode_buffer(*args, **kwargs)
+
+    def _encode_temporary_episode_video(self, video_key: str, episode_index: int) -> Path:
+        temp_path = self._pre_encoded.pop(video_key, None) if self._pre_encoded else None
+        if temp_path is None:
+            with timed(self.timer, "encode"):
+                if not self.use_ffmpeg_cli:
+                    return super()._encode_temporary_episode_video(video_key, episode_index)
+                temp_path = self._encode_episode_video(video_key, episode_index)
+        shutil.rmtree(self._image_dir(video_key, episode_index), ignore_errors=True)
+        return temp_path
+
+
+# HDF5 中的相机 dataset 名称 -> LeRobot feature 名称
+CAMERA_DATASETS = {
+    "image_left": "observation.images.left_wrist",
+    "image_mid": "observation.images.mid",
+    "image_right": "observation.images.right_wrist",
+}
+
+# 源图像分辨率 (height, width)
+SOURCE_RESOLUTION = tuple(BI_PIPER_FEATURES["observation.images.mid"]["shape"][:2])
+
+# JPEG 在 DCT 域缩小解码的倍数及对应的 imread 标志
+REDUCED_DECODE_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    1: cv2.IMREAD_COLOR,
+}
+
+
+def reduced_decode_flag(
+    resolution: Optional[Tuple[int, int]],
+    source_resolution: Tuple[int, int] = SOURCE_RESOLUTION,
+) -> int:
+    """选择缩小后仍不小于目标分辨率的最大 JPEG 缩小解码倍数，剩余部分再由 resize 完成"""
+    if resolution is None:
+        return cv2.IMREAD_COLOR
+    for scale, flag in REDUCED_DECODE_FLAGS.items():
+        if source_resolution[0] // scale >= resolution[0] and source_resolution[1] // scale >= resolution[1]:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def decode_image(
+    x,
+    resolution: Optional[Tuple[int, int]] = None,
+    flag: int = cv2.IMREAD_COLOR,
+) -> np.ndarray:
+    """
+    解码单帧图像：原始 ndim==3 数组直接使用，否则按 JPEG 字节解码
+    指定 resolution (height, width) 时，JPEG 先按 flag 缩小解码，尺寸仍不一致时再 resize
+    """
+    if isinstance(x, np.ndarray) and x.ndim == 3:
+        image = x
+    else:
+        image = cv2.imdecode(np.frombuffer(x, np.uint8), flag)
+    if resolution is not None and image.shape[:2] != tuple(resolution):
+        image = cv2.resize(image, (resolution[1], resolution[0]), interpolation=cv2.INTER_AREA)
+    return image
+
+
+class FrameDecoder:
+    """
+    基于线程池的多相机图像解码器
+    cv2.imdecode 在解码时会释放 GIL，多个线程可以同时解码不同帧/不同相机；
+    预取窗口限制同时在途的帧数，结果按输入顺序返回；
+    指定 resolution (height, width) 时输出缩小到该分辨率
+    """
+
+    def __init__(
+        self,
+        num_threads: int = 1,
+        lookahead: Optional[int] = None,
+        resolution: Optional[Tuple[int, int]] = None,
+        timer: Optional[StageTimer] = None,
+    ):
+        self.resolution = tuple(resolution) if resolution is not None else None
+        self.timer = timer
+        self._flag = reduced_decode_flag(self.resolution)
+        self.num_threads = max(1, num_threads)
+        self.lookahead = max(1, lookahead if lookahead is not None else 2 * self.num_threads)
+        self._pool = (
+            ThreadPoolExecutor(max_workers=self.num_threads, thread_name_prefix="decode")
+            if self.num_threads > 1
+            else None
+        )
+
+    def imap(self, frames: Iterable[Tuple[Any, Sequence]]) -> Iterator[Tuple[Any, List[np.ndarray]]]:
+        """
+        按顺序解码每一帧
+
+        Args:
+            frames: 每个元素是 (payload, 该帧各相机的原始数据)，payload 原样透传
+
+        Yields:
+            (payload, 该帧各相机解码后的图像)，顺序与输入一致
+        """
+        if self._pool is None:
+            for payload, raw_images in frames:
+                yield payload, [self._decode(x) for x in raw_images]
+            return
+
+        pending = deque()
+        for payload, raw_images in frames:
+            pending.append(
+                (payload, [self._pool.submit(self._decode, x) for x in raw_images])
+            )
+            if len(pending) >= self.lookahead:
+                payload, futures = pending.popleft()
+                yield payload, self._results(futures)
+        while pending:
+            payload, futures = pending.popleft()
+            yield payload, self._results(futures)
+
+    def _decode(self, x) -> np.ndarray:
+        if self.timer is None:
+            return decode_image(x, self.resolution, self._flag)
+        with self.timer.stage("decode"):
+            image = decode_image(x, self.resolution, self._flag)
+        self.timer.count("decode", nbytes=image.nbytes, frames=1)
+        return image
+
+    def _results(self, futures) -> List[np.ndarray]:
+        with timed(self.timer, "decode_wait"):
+            return [future.result() for future in futures]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+def aligned_window_size(datasets: Sequence[h5py.Dataset], window_size: int) -> int:
+    """将读取窗口向上对齐到各 dataset 第一维 chunk 长度的公倍数，保证每个 chunk 只被读取解压一次"""
+    chunk_rows = [ds.chunks[0] for ds in datasets if ds.chunks]
+    if not chunk_rows:
+        return max(1, window_size)
+    step = math.lcm(*chunk_rows)
+    return max(1, -(-window_size // step)) * step
+
+
+def resolve_frame_stride(fps: int, target_fps: Optional[int] = None, frame_stride: Optional[int] = None) -> int:
+    """根据源帧率以及目标帧率或抽帧步长确定步长，步长必须整除源帧率"""
+    stride = 1 if frame_stride is None else frame_stride
+    if target_fps is not None:
+        if target_fps <= 0 or fps % target_fps:
+            raise ValueError(f"Target fps {target_fps} must evenly divide the source fps {fps}")
+        if frame_stride is not None and frame_stride != fps // target_fps:
+            raise ValueError(f"Frame stride {frame_stride} does not match target fps {target_fps} at {fps} fps")
+        stride = fps // target_fps
+    if stride <= 0 or fps % stride:
+        raise ValueError(f"Frame stride {stride} must evenly divide the source fps {fps}")
+    return stride
+
+
+def strided_length(length: int, frame_stride: int = 1) -> int:
+    """抽帧后 episode 保留的帧数"""
+    return -(-length // frame_stride)
+
+
+def reduce_strided(values: np.ndarray, frame_stride: int, stride_reduce: str = "sample") -> np.ndarray:
+    """把连续帧的数值按步长归约为每个保留帧一行"""
+    if frame_stride == 1 or stride_reduce == "sample":
+        return values[::frame_stride]
+    offsets = np.arange(0, len(values), frame_stride)
+    counts = np.diff(np.append(offsets, len(values)))
+    return (np.add.reduceat(values, offsets, axis=0) / counts[:, None]).astype(values.dtype)
+
+
+# 变长 dataset 的 chunk 中每行是一个全局堆引用：序列长度、堆集合地址、集合内对象编号
+VLEN_REFERENCE_DTYPE = np.dtype([("length", "<u4"), ("address", "<u8"), ("index", "<u4")])
+
+
+class PackedFrames:
+    """
+    一个读取窗口内某相机的全部 JPEG 帧：帧字节连续存放在一个 uint8 缓冲区中，offsets[i]:offsets[i + 1] 为第 i 帧
+    按下标取出的是零拷贝的 memoryview，可以直接交给 cv2.imdecode（经 np.frombuffer）或写入编码管道；
+    缓冲区每次读取新分配，各帧的 memoryview 持有它的引用，生命周期与后续读取无关
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+        self._view = memoryview(data)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> memoryview:
+        return self._view[self.offsets[index] : self.offsets[index + 1]]
+
+    def __iter__(self) -> Iterator[memoryview]:
+        return (self[i] for i in range(len(self)))
+
+
+def is_direct_vlen_readable(ds: h5py.Dataset) -> bool:
+    """
+    变长 uint8 dataset 能否绕过 h5py 直接读取：要求一维分块存储、没有过滤器、文件地址和长度均为 8 字节、
+    使用默认的 sec2 驱动（可以取得文件描述符）
+    """
+    return (
+        h5py.check_vlen_dtype(ds.dtype) == np.dtype(np.uint8)
+        and ds.ndim == 1
+        and ds.chunks is not None
+        and ds.id.get_create_plist().get_nfilters() == 0
+        and ds.file.driver == "sec2"
+        and ds.file.id.get_create_plist().get_sizes() == (8, 8)
+    )
+
+
+def read_vlen_references(ds: h5py.Dataset, start: int, stop: int) -> Optional[np.ndarray]:
+    """
+    读取变长 dataset 第 start 到 stop 行的全局堆引用（VLEN_REFERENCE_DTYPE），不读取帧数据本身
+    直接读取整个 chunk 的原始字节，不满足 is_direct_vlen_readable 或遇到未写入的 chunk 时返回 None
+    """
+    if not is_direct_vlen_readable(ds):
+        return None
+    chunk_rows = ds.chunks[0]
+    first = start // chunk_rows * chunk_rows
+    chunks = []
+    for chunk_start in range(first, stop, chunk_rows):
+        if ds.id.get_chunk_info_by_coord((chunk_start,)).byte_offset is None:
+            return None
+        _, raw = ds.id.read_direct_chunk((chunk_start,))
+        chunks.append(np.frombuffer(raw, VLEN_REFERENCE_DTYPE))
+    if not chunks:
+        return np.empty(0, VLEN_REFERENCE_DTYPE)
+    return np.concatenate(chunks)[start - first : stop - first]
+
+
+def read_global_heap(fd: int, position: int) -> Tuple[bytes, Dict[int, int]]:
+    """
+    读取文件中 position 处的一个全局堆集合
+
+    Returns:
+        (集合的原始字节, {对象编号: 对象数据在集合中的偏移})
+    """
+    header = os.pread(fd, 16, position)
+    if header[:4] != b"GCOL":
+        raise OSError(f"No global heap collection at file offset {position}")
+    (size,) = struct.unpack_from("<Q", header, 8)
+    heap = os.pread(fd, size, position)
+    objects = {}
+    # 每个对象：编号 (2)、引用计数 (2)、保留 (4)、大小 (8)，数据按 8 字节对齐；编号 0 为剩余的空闲空间
+    offset = 16
+    while offset + 16 <= len(heap):
+        index, _, _, object_size = struct.unpack_from("<HHIQ", heap, offset)
+        if index == 0:
+            break
+        objects[index] = offset + 16
+        offset += 16 + (object_size + 7) // 8 * 8
+    return heap, objects
+
+
+def pack_frames(frames: Sequence[np.ndarray]) -> PackedFrames:
+    """把 h5py 读出的变长帧（每帧一个 uint8 数组）拼接为 PackedFrames"""
+    offsets = np.zeros(len(frames) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, frames), dtype=np.int64, count=len(frames)), out=offsets[1:])
+    data = np.empty(int(offsets[-1]), dtype=np.uint8)
+    if len(frames):
+        np.concatenate(frames, out=data)
+    return PackedFrames(data, offsets)
+
+
+def read_vlen_frames(ds: h5py.Dataset, start: int, stop: int, step: int = 1) -> PackedFrames:
+    """
+    读取变长 JPEG 字节 dataset 的 start:stop:step 行，返回 PackedFrames
+
+    h5py 读取变长 dataset 时总会为每行新建一个数组；这里先从 chunk 中取出各行的全局堆引用，
+    再按堆集合从文件中读出帧数据，直接拷贝到连续的缓冲区，不产生逐行的数组；
+    无法直接读取的 dataset（见 is_direct_vlen_readable）回退到 h5py 读取后拼接
+    """
+    references = read_vlen_references(ds, start, stop)
+    if references is None:
+        return pack_frames(ds[start:stop:step])
+
+    references = references[::step]
+    lengths = references["length"].astype(np.int64)
+    offsets = np.zeros(len(references) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    data = np.empty(int(offsets[-1]), dtype=np.uint8)
+
+    fd = ds.file.id.get_vfd_handle()
+    base = ds.file.userblock_size
+    for address in np.unique(references["address"][lengths > 0]):
+        heap, objects = read_global_heap(fd, base + int(address))
+        heap = np.frombuffer(heap, np.uint8)
+        for row in np.flatnonzero((references["address"] == address) & (lengths > 0)):
+            position = objects[int(references["index"][row])]
+            data[offsets[row] : offsets[row + 1]] = heap[position : position + lengths[row]]
+    return PackedFrames(data, offsets)
+
+
+class ReadBuffers:
+    """
+    每个 worker 复用的 HDF5 读取缓冲区
+    按 dataset 名称（如 "action"、"image_left"）各保留 num_slots 个轮换使用的缓冲区，
+    容量增长到目前见过的最大读取量后不再变化，通过 Dataset.read_direct 直接读入，稳态下读取不再分配内存；
+    返回的数组是缓冲区的视图，同一名称再读取 num_slots 次后会被覆盖，
+    因此 num_slots 需要覆盖所有仍在使用中的读取结果（见 read_buffer_slots）；
+    变长的 JPEG 字节 dataset 不经过轮换的缓冲区，由 read_vlen_frames 读成新分配的 PackedFrames
+    """
+
+    def __init__(self, num_slots: int = 2, timer: Optional[StageTimer] = None):
+        self.num_slots = max(1, num_slots)
+        self.timer = timer
+        self._slots: Dict[str, List[Optional[np.ndarray]]] = {}
+        self._next: Dict[str, int] = {}
+
+    def _buffer(self, name: str, rows: int, row_shape: Tuple[int, ...], dtype: np.dtype) -> np.ndarray:
+        """取出该名称下一个轮换的缓冲区，容量不足时按 rows 重新分配"""
+        slots = self._slots.setdefault(name, [None] * self.num_slots)
+        index = self._next.get(name, 0)
+        self._next[name] = (index + 1) % self.num_slots
+
+        buffer = slots[index]
+        if buffer is None or buffer.shape[1:] != tuple(row_shape) or buffer.dtype != dtype:
+            buffer = None
+        if buffer is None or len(buffer) < rows:
+            capacity = max(rows, len(buffer) if buffer is not None else 0)
+            buffer = slots[index] = np.empty((capacity, *row_shape), dtype=dtype)
+        return buffer
+
+    def read(self, ds: h5py.Dataset, start: int, stop: int, step: int = 1) -> Union[np.ndarray, PackedFrames]:
+        with timed(self.timer, "read"):
+            data = self._read(ds, start, stop, step)
+        if self.timer is not None:
+            # 只有相机数据计入帧数
+            is_image = isinstance(data, PackedFrames) or data.ndim == 4
+            self.timer.count("read", nbytes=data.nbytes, frames=len(data) if is_image else 0)
+        return data
+
+    def _read(self, ds: h5py.Dataset, start: int, stop: int, step: int) -> Union[np.ndarray, PackedFrames]:
+        if h5py.check_vlen_dtype(ds.dtype) is not None:
+            return read_vlen_frames(ds, start, stop, step)
+
+        name = ds.name.rsplit("/", 1)[-1]
+        rows = len(range(start, stop, step))
+        buffer = self._buffer(name, rows, ds.shape[1:], ds.dtype)
+        if rows:
+            ds.read_direct(buffer, np.s_[start:stop:step], np.s_[0:rows])
+        return buffer[:rows]
+
+
+def read_buffer_slots(decoder: FrameDecoder, read_window: int, queue_depth: int = 0, frame_stride: int = 1) -> int:
+    """
+    计算 ReadBuffers 需要轮换的缓冲区个数
+    仍在使用中的帧最多为解码预取的帧数加上预取队列和生产者/消费者手中的批次（每批 read_window 帧）；
+    抽帧时每次读取只返回 read_window // frame_stride 帧，同样多的帧会跨越更多次读取，
+    每段连续的帧与读取窗口不对齐时还可能多跨一次
+    """
+    frames_per_read = max(1, read_window // max(1, frame_stride))
+    lookahead_reads = -(-decoder.lookahead // frames_per_read) + 1
+    batch_reads = -(-max(1, read_window) // frames_per_read) + 1
+    return lookahead_reads + (queue_depth + 2) * batch_reads
+
+
+def read_episode_arrays(
+    episode_group: h5py.Group,
+    frame_stride: int = 1,
+    stride_reduce: str = "sample",
+    buffers: Optional[ReadBuffers] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """一次读出整个 episode 的 action/state，返回 (T, 14) 数组；指定 buffers 时读入复用的缓冲区"""
+    episode_frame_length = int(episode_group.attrs.get("length"))
+    arrays = []
+    for name in ("action", "state"):
+        ds = episode_group[name]
+        # 只取窗口第一帧时直接按步长读取，避免读出被丢弃的行
+        step = frame_stride if stride_reduce == "sample" else 1
+        if buffers is not None:
+            values = buffers.read(ds, 0, episode_frame_length, step)
+        else:
+            values = ds[0:episode_frame_length:step]
+        arrays.append(values if step == frame_stride else reduce_strided(values, frame_stride, stride_reduce))
+    action, state = arrays
+    return action, state
+
+
+def is_jpeg_episode(episode_group: h5py.Group) -> bool:
+    """相机数据是否为逐帧 JPEG 字节（而非原始 (T, H, W, 3) 数组）"""
+    return all(episode_group[name].ndim == 1 for name in CAMERA_DATASETS)
+
+
+def episode_checksum(episode_group: h5py.Group) -> str:
+    """
+    episode 数据的校验值，不需要读取图像数据
+    由所在文件的大小和修改时间、episode 长度以及各 dataset 的形状、类型和存储字节数计算，文件被改写后缓存自动失效
+    """
+    stat = os.stat(episode_group.file.filename)
+    fields = [stat.st_size, stat.st_mtime_ns, int(episode_group.attrs.get("length"))]
+    for name in ("action", "state", *CAMERA_DATASETS):
+        ds = episode_group[name]
+        fields.append([list(ds.shape), str(ds.dtype), ds.id.get_storage_size()])
+    return hashlib.sha1(json.dumps(fields).encode()).hexdigest()
+
+
+class DecodedFrameCache:
+    """
+    解码帧的磁盘缓存，使用不同编码配置、分辨率或帧率重复转换同一批 episode 时跳过 JPEG 解码
+
+    每个条目是一个目录，保存某个 episode 在给定解码参数下每个相机的 (T, H, W, 3) uint8 .npy 文件，命中时以 memmap 打开；
+    条目以 (文件, episode, 数据校验值, 解码参数) 的哈希命名，先写入临时目录，完整写完后再重命名，多个 worker 可以共享同一目录；
+    总大小超过 max_bytes 时按最近使用时间（目录 mtime）淘汰最久未用的条目
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def key(self, episode_group: h5py.Group, resolution: Optional[Tuple[int, int]], frame_stride: int) -> str:
+        fields = [
+            os.path.abspath(episode_group.file.filename),
+            episode_group.name,
+            episode_checksum(episode_group),
+            list(resolution) if resolution is not None else None,
+            frame_stride,
+        ]
+        return hashlib.sha1(json.dumps(fields).encode()).hexdigest()
+
+    def load(self, key: str) -> Optional[List[np.ndarray]]:
+        """命中时返回每个相机的只读 memmap，未命中返回 None"""
+        entry = self.cache_dir / key
+        try:
+            arrays = [np.load(entry / f"{camera}.npy", mmap_mode="r") for camera in CAMERA_DATASETS]
+            os.utime(entry)
+        except (FileNotFoundError, ValueError):
+            return None
+        return arrays
+
+    def store(self, key: str, frames: Iterable[List[np.ndarray]], num_frames: int) -> Iterator[List[np.ndarray]]:
+        """
+        原样产出 frames，同时写入缓存
+        只有完整产出 num_frames 帧后才提交条目，中途中断时丢弃临时文件
+        """
+        tmp_dir = Path(tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-"))
+        try:
+            arrays = None
+            count = 0
+            for images in frames:
+                if arrays is None:
+                    arrays = [
+                        np.lib.format.open_memmap(
+                            tmp_dir / f"{camera}.npy", mode="w+", dtype=np.uint8, shape=(num_frames, *image.shape)
+                        )
+                        for camera, image in zip(CAMERA_DATASETS, images)
+                    ]
+                if count < num_frames:
+                    for array, image in zip(arrays, images):
+                        array[count] = image
+                count += 1
+                yield images
+
+            if arrays is not None and count == num_frames:
+                for array in arrays:
+                    array.flush()
+                try:
+                    tmp_dir.rename(self.cache_dir / key)
+                except OSError:
+                    # 其他 worker 已经写入了同一条目
+                    pass
+                else:
+                    os.utime(self.cache_dir / key)
+                    self.evict()
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def evict(self):
+        """按最近使用时间淘汰条目，直到总大小不超过 max_bytes"""
+        entries = []
+        for entry in self.cache_dir.iterdir():
+            if entry.name.startswith("."):
+                continue
+            try:
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+            except FileNotFoundError:
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+
+def iter_camera_frames(
+    episode_group: h5py.Group,
+    window_size: int = DEFAULT_READ_WINDOW,
+    frame_stride: int = 1,
+    buffers: Optional[ReadBuffers] = None,
+) -> Iterator[List[Any]]:
+    """
+    按 chunk 对齐的窗口流式读取各相机的原始图像数据，只读取保留的帧
+    JPEG 字节以 PackedFrames 的 memoryview 形式产出；指定 buffers 时原始 (T, H, W, 3) 图像读入复用的窗口缓冲区
+    """
+    episode_frame_length = int(episode_group.attrs.get("length"))
+    camera_ds = [episode_group[name] for name in CAMERA_DATASETS]
+
+    window = math.lcm(aligned_window_size(camera_ds, window_size), frame_stride)
+    for start in range(0, episode_frame_length, window):
+        stop = min(start + window, episode_frame_length)
+        if buffers is not None:
+            camera_images = [buffers.read(ds, start, stop, frame_stride) for ds in camera_ds]
+        else:
+            camera_images = [
+                read_vlen_frames(ds, start, stop, frame_stride)
+                if h5py.check_vlen_dtype(ds.dtype) is not None
+                else ds[start:stop:frame_stride]
+                for ds in camera_ds
+            ]
+        yield from (list(images) for images in zip(*camera_images))
+
+
+def iter_episode_images(
+    episode_group: h5py.Group,
+    decoder: FrameDecoder,
+    read_window: int = DEFAULT_READ_WINDOW,
+    jpeg_passthrough: bool = False,
+    frame_stride: int = 1,
+    buffers: Optional[ReadBuffers] = None,
+    cache: Optional[DecodedFrameCache] = None,
+) -> Iterator[Tuple[List[np.ndarray], Optional[List[Any]]]]:
+    """
+    按顺序产出每一帧各相机的 (解码图像, 原始 JPEG 字节)
+
+    jpeg_passthrough 为 True 且相机数据是 JPEG 字节时，原始字节随帧一起产出交给编码器，
+    只解码计算统计量会采样的帧，其余帧用全零占位图通过 dataset 的校验；
+    相机数据为原始 ndim==3 数组时仍走解码像素的路径，原始字节为 None；
+    指定 cache 时，解码像素的路径优先从缓存读取，未命中时解码并写入缓存
+    """
+    passthrough = jpeg_passthrough and is_jpeg_episode(episode_group)
+    output_length = strided_length(int(episode_group.attrs.get("length")), frame_stride)
+    stats_frames = set(int(i) for i in sample_indices(output_length)) if passthrough else None
+
+    if cache is not None and not passthrough:
+        key = cache.key(episode_group, decoder.resolution, frame_stride)
+        cached = cache.load(key)
+        if cached is not None:
+            for frame_index in range(output_length):
+                yield [array[frame_index] for array in cached], None
+            return
+        camera_frames = iter_camera_frames(episode_group, read_window, frame_stride, buffers)
+        decoded = (images for _, images in decoder.imap((None, raw_images) for raw_images in camera_frames))
+        for images in cache.store(key, decoded, output_length):
+            yield images, None
+        return
+
+    def raw_frames():
+        frames = iter_camera_frames(episode_group, read_window, frame_stride, buffers)
+        for frame_index, raw_images in enumerate(frames):
+            if passthrough:
+                to_decode = raw_images if frame_index in stats_frames else []
+                yield raw_images, to_decode
+            else:
+                yield None, raw_images
+
+    placeholders = None
+    for encoded_images, images in decoder.imap(raw_frames()):
+        if encoded_images is not None:
+            if images:
+                if placeholders is None:
+                    placeholders = [np.zeros_like(image) for image in images]
+            else:
+                images = placeholders
+        yield images, encoded_images
+
+
+def camera_streams(
+    frames: Iterable[Tuple[List[np.ndarray], Optional[List[Any]]]],
+    with_encoded: bool = False,
+) -> Tuple[Dict[str, Iterator[np.ndarray]], Optional[Dict[str, Iterator[Any]]]]:
+    """
+    把逐帧的 (解码图像, 原始 JPEG 字节) 拆成每个相机一个迭代器，供 add_episode_arrays 使用
+    各迭代器按帧同步消费，tee 只缓存当前帧
+    """
+    camera_keys = list(CAMERA_DATASETS.values())
+    num_streams = len(camera_keys) * (2 if with_encoded else 1)
+    rows = (images + (encoded_images or []) for images, encoded_images in frames)
+    streams = [map(operator.itemgetter(i), stream) for i, stream in enumerate(itertools.tee(rows, num_streams))]
+    images = dict(zip(camera_keys, streams[: len(camera_keys)]))
+    encoded_images = dict(zip(camera_keys, streams[len(camera_keys) :])) if with_encoded else None
+    return images, encoded_images
+
+
+def read_episode(
+    episode_group: h5py.Group,
+    decoder: FrameDecoder,
+    read_window: int = DEFAULT_READ_WINDOW,
+    jpeg_passthrough: bool = False,
+    frame_stride: int = 1,
+    stride_reduce: str = "sample",
+    buffers: Optional[ReadBuffers] = None,
+    cache: Optional[DecodedFrameCache] = None,
+) -> dict:
+    """
+    读取整个 episode，返回可直接传给 BiPiperDataset.add_episode_arrays 的参数
+    图像以每个相机一个迭代器的形式按需读取解码
+    """
+    action, state = read_episode_arrays(episode_group, frame_stride, stride_reduce, buffers)
+    passthrough = jpeg_passthrough and is_jpeg_episode(episode_group)
+    frames = iter_episode_images(episode_group, decoder, read_window, passthrough, frame_stride, buffers, cache)
+    images, encoded_images = camera_streams(frames, passthrough)
+    return {
+        "action": action,
+        "state": state,
+        "images": images,
+        "task": episode_group.attrs.get("instruction"),
+        "encoded_images": encoded_images,
+    }
+
+
+def iter_frame_dicts(
+    episode_group: h5py.Group,
+    decoder: FrameDecoder,
+    read_window: int = DEFAULT_READ_WINDOW,
+    jpeg_passthrough: bool = False,
+    frame_stride: int = 1,
+    stride_reduce: str = "sample",
+) -> Iterator[dict]:
+    """按顺序产出可直接传给 dataset.add_frame 的 frame，原始 JPEG 字节放在 ENCODED_FRAMES_KEY 中"""
+    episode_instruction = episode_group.attrs.get("instruction")
+    camera_keys = list(CAMERA_DATASETS.values())
+
+    action, state = read_episode_arrays(episode_group, frame_stride, stride_reduce)
+    frames = iter_episode_images(episode_group, decoder, read_window, jpeg_passthrough, frame_stride)
+    for action_row, state_row, (images, encoded_images) in zip(action, state, frames):
+        frame = {
+            "action": action_row,
+            "observation.state": state_row,
+        }
+        frame.update(zip(camera_keys, images))
+        frame["task"] = episode_instruction
+        if encoded_images is not None:
+            frame[ENCODED_FRAMES_KEY] = dict(zip(camera_keys, encoded_images))
+        yield frame
+
+
+def process_data(
+    dataset: LeRobotDataset,
+    episode_group: h5py.Group,
+    episode_name: str,
+    decoder: Optional[FrameDecoder] = None,
+    read_window: int = DEFAULT_READ_WINDOW,
+    frame_stride: int = 1,
+    stride_reduce: str = "sample",
+    buffers: Optional[ReadBuffers] = None,
+    cache: Optional[DecodedFrameCache] = None,
+) -> bool:
+    """处理单个 episode 的数据"""
+    import logging
+
+    episode_frame_length = strided_length(int(episode_group.attrs.get("length")), frame_stride)
+
+    if decoder is None:
+        decoder = FrameDecoder()
+
+    if isinstance(dataset, BiPiperDataset):
+        # 批量写入：action/state 整列放入 episode buffer，图像按相机流式写入
+        episode = read_episode(
+            episode_group, decoder, read_window, dataset.jpeg_passthrough, frame_stride, stride_reduce, buffers, cache
+        )
+        dataset.begin_episode(len(episode["action"]))
+        dataset.add_episode_arrays(**episode)
+    else:
+        for frame in iter_frame_dicts(episode_group, decoder, read_window, False, frame_stride, stride_reduce):
+            dataset.add_frame(frame=frame)
+
+    logging.info(f"Processed episode '{episode_name}' with {episode_frame_length} frames")
+    return True
+
+
+def iter_episode_groups(episodes: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str, h5py.Group]]:
+    """
+    依次打开每个 (hdf5 文件, episode 名称) 对应的 group
+    连续来自同一文件的 episode 复用同一个文件句柄
+    """
+    current_file, f = None, None
+    try:
+        for hdf5_file, episode_name in episodes:
+            if hdf5_file != current_file:
+                if f is not None:
+                    f.close()
+                f = h5py.File(hdf5_file, "r")
+                current_file = hdf5_file
+            yield hdf5_file, episode_name, f[episode_name]
+    finally:
+        if f is not None:
+            f.close()
+
+def list_episodes(hdf5_files: Iterable[str]) -> List[Tuple[str, str]]:
+    """列出所有 (hdf5 文件, episode 名称)"""
+    episodes = []
+    for hdf5_file in hdf5_files:
+        with h5py.File(hdf5_file, "r") as f:
+            episodes.extend((hdf5_file, episode_name) for episode_name in f.keys())
+    return episodes
+
+
+def dataset_storage_size(ds: h5py.Dataset) -> int:
+    """
+    dataset 的数据字节数
+    变长 dataset 的 get_storage_size 只包含 chunk 中的全局堆引用，帧数据本身在全局堆中，因此按各行长度累加：
+    能直接读取 chunk 时只读取堆引用，否则按 chunk 分批读出各行
+    """
+    base_dtype = h5py.check_vlen_dtype(ds.dtype)
+    if not isinstance(base_dtype, np.dtype) or ds.ndim != 1:
+        return ds.id.get_storage_size()
+    references = read_vlen_references(ds, 0, len(ds))
+    if references is not None:
+        return int(references["length"].sum(dtype=np.int64)) * base_dtype.itemsize
+    batch = ds.chunks[0] if ds.chunks else DEFAULT_READ_WINDOW
+    return sum(row.nbytes for start in range(0, len(ds), batch) for row in ds[start : start + batch])
+
+
+def episode_storage_size(episode_group: h5py.Group) -> int:
+    """episode group 内所有 dataset 的数据字节数（见 dataset_storage_size）"""
+    return sum(dataset_storage_size(obj) for obj in episode_group.values() if isinstance(obj, h5py.Dataset))
+
+
+class EpisodePrefetcher:
+    """
+    在后台线程中读取并解码后续 episode 的帧
+    主线程写入图像 / save_episode（视频编码）时，下一个 episode 的读取和解码同时进行；
+    队列中最多缓存 queue_depth 个帧批次，每批 read_window 帧
+
+    用法:
+        for hdf5_file, episode_name, length, episode in prefetcher:
+            dataset.add_episode_arrays(**episode)
+            dataset.save_episode()
+
+    episode_nbytes 为当前 episode 在 HDF5 中占用的字节数，用于进度统计
+    """
+
+    def __init__(
+        self,
+        episodes: Iterable[Tuple[str, str]],
+        decoder: FrameDecoder,
+        read_window: int = DEFAULT_READ_WINDOW,
+        queue_depth: int = 4,
+        jpeg_passthrough: bool = False,
+        frame_stride: int = 1,
+        stride_reduce: str = "sample",
+        cache: Optional[DecodedFrameCache] = None,
+        timer: Optional[StageTimer] = None,
+    ):
+        self.episodes = episodes
+        self.decoder = decoder
+        self.read_window = read_window
+        self.jpeg_passthrough = jpeg_passthrough
+        self.frame_stride = frame_stride
+        self.stride_reduce = stride_reduce
+        self.cache = cache
+        self.timer = timer
+        # 预取线程独占的读取缓冲区，轮换个数覆盖队列中缓存的所有帧
+        self.buffers = ReadBuffers(read_buffer_slots(decoder, read_window, queue_depth, frame_stride), timer)
+        self._queue = queue.Queue(maxsize=max(1, queue_depth))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, name="episode-prefetch", daemon=True)
+        self.episode_nbytes = 0
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        try:
+            for hdf5_file, episode_name, episode_group in iter_episode_groups(self.episodes):
+                action, state = read_episode_arrays(
+                    episode_group, self.frame_stride, self.stride_reduce, self.buffers
+                )
+                passthrough = self.jpeg_passthrough and is_jpeg_episode(episode_group)
+                task = episode_group.attrs.get("instruction")
+                nbytes = episode_storage_size(episode_group)
+                if not self._put(("episode", (hdf5_file, episode_name, action, state, task, passthrough, nbytes))):
+                    return
+                batch = []
+                frames = iter_episode_images(
+                    episode_group,
+                    self.decoder,
+                    self.read_window,
+                    passthrough,
+                    self.frame_stride,
+                    self.buffers,
+                    self.cache,
+                )
+                for frame in frames:
+                    batch.append(frame)
+                    if len(batch) >= self.read_window:
+                        if not self._put(("frames", batch)):
+                            return
+                        batch = []
+                if batch and not self._put(("frames", batch)):
+                    return
+                if not self._put(("end", None)):
+                    return
+            self._put(("done", None))
+        except BaseException as e:
+            self._put(("error", e))
+
+    def _get(self):
+        with timed(self.timer, "prefetch_wait"):
+            kind, value = self._queue.get()
+        if kind == "error":
+            raise value
+        return kind, value
+
+    def _iter_frames(self) -> Iterator[Tuple[List[np.ndarray], Optional[List[Any]]]]:
+        while True:
+            kind, value = self._get()
+            if kind == "end":
+                return
+            yield from value
+
+    def __iter__(self) -> Iterator[Tuple[str, str, int, dict]]:
+        if not self._thread.is_alive():
+            self._thread.start()
+        while True:
+            kind, value = self._get()
+            if kind == "done":
+                return
+            hdf5_file, episode_name, action, state, task, passthrough, self.episode_nbytes = value
+            images, encoded_images = camera_streams(self._iter_frames(), passthrough)
+            episode = {
+                "action": action,
+                "state": state,
+                "images": images,
+                "task": task,
+                "encoded_images": encoded_images,
+            }
+            yield hdf5_file, episode_name, len(action), episode
+
+    def close(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
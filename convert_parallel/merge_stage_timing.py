@@ -0,0 +1,120 @@
+"""
+汇总 convert_hdf5_shards.py 各 rank 写出的分阶段计时结果
+
+每个 rank 在 <logs-dir>/<job-name>/stage_timing/ 下写出 rank_XXXXX.json 和 rank_XXXXX.csv，
+本工具合并所有 rank，打印各阶段的总耗时、CPU 时间和吞吐以及每个 rank 的耗时，
+并写出合并后的 JSON 报告和逐 episode 的 CSV
+"""
+
+import argparse
+import csv
+import json
+from pathlib import Path
+
+
+def load_reports(timing_dir: Path) -> list:
+    reports = []
+    for path in sorted(timing_dir.glob("rank_*.json")):
+        with open(path) as f:
+            reports.append(json.load(f))
+    return reports
+
+
+def merge_reports(reports: list) -> dict:
+    """按阶段累加所有 rank 的计时结果"""
+    stages = {}
+    for report in reports:
+        for stage, totals in report["stages"].items():
+            merged = stages.setdefault(stage, {field: 0 for field in totals})
+            for field, value in totals.items():
+                merged[field] += value
+    ranks = [
+        {
+            "rank": report.get("rank"),
+            "shard": report.get("shard"),
+            "elapsed_s": report["elapsed_s"],
+            "episodes": report["episodes"],
+            "frames": report["stages"].get("add_frame", {}).get("frames", 0),
+        }
+        for report in reports
+    ]
+    return {
+        "num_ranks": len(reports),
+        "episodes": sum(report["episodes"] for report in reports),
+        "makespan_s": max((report["elapsed_s"] for report in reports), default=0.0),
+        "stages": stages,
+        "ranks": ranks,
+    }
+
+
+def format_report(merged: dict) -> list:
+    lines = []
+    lines.append(
+        f"{merged['num_ranks']} ranks, {merged['episodes']} episodes, makespan {merged['makespan_s']:.1f}s"
+    )
+    lines.append("")
+
+    stages = merged["stages"]
+    total_wall = sum(totals["wall_s"] for totals in stages.values()) or 1.0
+    lines.append(f"{'stage':<14} {'wall s':>10} {'share':>7} {'cpu s':>10} {'MB':>10} {'frames':>9} {'MB/s':>8} {'fps':>9}")
+    for stage, totals in stages.items():
+        wall = totals["wall_s"]
+        megabytes = totals["bytes"] / 1024 / 1024
+        lines.append(
+            f"{stage:<14} {wall:>10.1f} {wall / total_wall:>6.1%} {totals['cpu_s']:>10.1f} {megabytes:>10.1f} "
+            f"{totals['frames']:>9} {megabytes / wall if wall else 0:>8.1f} {totals['frames'] / wall if wall else 0:>9.1f}"
+        )
+    lines.append("")
+
+    lines.append(f"{'rank':<6} {'elapsed s':>10} {'episodes':>9} {'frames':>9} {'fps':>8}")
+    for rank in sorted(merged["ranks"], key=lambda r: -r["elapsed_s"]):
+        fps = rank["frames"] / rank["elapsed_s"] if rank["elapsed_s"] else 0
+        lines.append(f"{rank['rank']!s:<6} {rank['elapsed_s']:>10.1f} {rank['episodes']:>9} {rank['frames']:>9} {fps:>8.1f}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="汇总 convert_hdf5_shards.py 各 rank 的分阶段计时结果")
+
+    parser.add_argument(
+        "--timing-dir",
+        type=Path,
+        required=True,
+        help="Directory with per-rank timing files (<logs-dir>/<job-name>/stage_timing)",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Prefix of the merged report, writes <output>.json and <output>.csv (default: <timing-dir>/merged)",
+    )
+
+    args = parser.parse_args()
+
+    reports = load_reports(args.timing_dir)
+    if not reports:
+        print(f"Error: No rank_*.json files found in {args.timing_dir}")
+        return 1
+
+    merged = merge_reports(reports)
+    for line in format_report(merged):
+        print(line)
+
+    output = args.output if args.output is not None else args.timing_dir / "merged"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output.with_suffix(".json"), "w") as f:
+        json.dump(merged, f, indent=2)
+
+    rows = [{"rank": report.get("rank"), **episode} for report in reports for episode in report["per_episode"]]
+    with open(output.with_suffix(".csv"), "w", newline="") as f:
+        fieldnames = ["rank"] + [field for field in (rows[0] if rows else {}) if field != "rank"]
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(f"\nMerged report written to {output.with_suffix('.json')} and {output.with_suffix('.csv')}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -9,20 +9,124 @@
 
 import h5py
 import numpy as np
+import os
 from pathlib import Path
 import typer
 from typing import Optional
 from tqdm import tqdm
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 
-def copy_group(src_group: h5py.Group, dst_group: h5py.Group):
+# 压缩选项：keep 沿用源 dataset 的设置，none 不压缩
+COMPRESSION_CHOICES = ("keep", "none", "gzip", "lzf")
+
+# 流式复制时每批读写的数据量上限，变长 dataset（如 JPEG 帧）每批最多 VLEN_COPY_ROWS 行
+COPY_BLOCK_BYTES = 64 * 1024 * 1024
+VLEN_COPY_ROWS = 256
+
+
+def source_layout(obj: h5py.Dataset) -> dict:
+    """源 dataset 的 chunk 与过滤器设置"""
+    return {
+        "chunks": obj.chunks,
+        "compression": obj.compression,
+        "compression_opts": obj.compression_opts,
+        "shuffle": obj.shuffle,
+    }
+
+
+def target_layout(
+    obj: h5py.Dataset,
+    compression: str = "keep",
+    compression_level: Optional[int] = None,
+    chunk_frames: Optional[int] = None,
+) -> dict:
+    """
+    目标 dataset 的 chunk 与过滤器设置，未指定的项沿用源 dataset
+
+    Args:
+        obj: 源 dataset
+        compression: COMPRESSION_CHOICES 之一
+        compression_level: gzip 压缩等级
+        chunk_frames: 沿第一维（帧）的 chunk 长度
+    """
+    layout = source_layout(obj)
+    if obj.ndim == 0:
+        # 标量 dataset 不能分块和压缩
+        return layout
+    if compression != "keep":
+        layout["compression"] = None if compression == "none" else compression
+        if compression_level is not None or layout["compression"] != obj.compression:
+            # 压缩方式与源相同且未指定等级时沿用源的压缩参数
+            layout["compression_opts"] = compression_level if compression == "gzip" else None
+        layout["shuffle"] = obj.shuffle and layout["compression"] is not None
+    if chunk_frames is not None:
+        layout["chunks"] = (max(1, min(chunk_frames, obj.shape[0])),) + obj.shape[1:]
+    if layout["compression"] is not None and layout["chunks"] is None:
+        # 压缩要求分块存储
+        layout["chunks"] = True
+    return layout
+
+
+def stream_copy_dataset(obj: h5py.Dataset, dst_group: h5py.Group, name: str, layout: dict):
+    """
+    按新的 chunk 与过滤器设置逐批复制 dataset，每批只在内存中保留若干 chunk
+
+    Args:
+        obj: 源 dataset
+        dst_group: 目标 group
+        name: 目标 dataset 名称
+        layout: target_layout 返回的设置
+    """
+    dst = dst_group.create_dataset(
+        name,
+        shape=obj.shape,
+        dtype=obj.dtype,
+        maxshape=obj.maxshape if layout["chunks"] is not None else None,
+        **layout,
+    )
+    for attr_name, attr_value in obj.attrs.items():
+        dst.attrs[attr_name] = attr_value
+
+    if obj.ndim == 0:
+        dst[()] = obj[()]
+        return
+    if obj.shape[0] == 0:
+        return
+
+    # 每批的行数取 chunk 长度的整数倍，读写都落在完整的 chunk 上
+    step = (dst.chunks or obj.chunks or (1,))[0]
+    if h5py.check_vlen_dtype(obj.dtype) is not None:
+        rows = VLEN_COPY_ROWS
+    else:
+        row_bytes = obj.dtype.itemsize * int(np.prod(obj.shape[1:]))
+        rows = COPY_BLOCK_BYTES // max(row_bytes, 1)
+    rows = max(step, rows // step * step)
+    for start in range(0, obj.shape[0], rows):
+        stop = min(start + rows, obj.shape[0])
+        dst[start:stop] = obj[start:stop]
+
+
+def copy_group(
+    src_group: h5py.Group,
+    dst_group: h5py.Group,
+    compression: str = "keep",
+    compression_level: Optional[int] = None,
+    chunk_frames: Optional[int] = None,
+):
     """
     递归复制 HDF5 group 及其所有 datasets 和子 groups
 
+    chunk 与过滤器设置不变的 dataset 使用 HDF5 原生对象复制（H5Ocopy），直接搬运压缩后的 chunk，
+    不解压、不重新压缩，内存占用与 dataset 大小无关；需要修改压缩方式或 chunk 长度时逐批流式复制
+
     Args:
         src_group: 源 group
         dst_group: 目标 group
+        compression: COMPRESSION_CHOICES 之一，默认沿用源 dataset 的压缩方式
+        compression_level: gzip 压缩等级
+        chunk_frames: 沿第一维（帧）的 chunk 长度，默认沿用源 dataset
     """
     # 复制属性
     for attr_name, attr_value in src_group.attrs.items():
@@ -31,22 +135,95 @@ def copy_group(src_group: h5py.Group, dst_group: h5py.Group):
     # 复制所有内容
     for name, obj in src_group.items():
         if isinstance(obj, h5py.Dataset):
-            # 复制 dataset
-            dst_group.create_dataset(
-                name,
-                data=obj[()],
-                dtype=obj.dtype,
-                compression=obj.compression,
-                compression_opts=obj.compression_opts,
-                shuffle=obj.shuffle,
-            )
-            # 复制 dataset 属性
-            for attr_name, attr_value in obj.attrs.items():
-                dst_group[name].attrs[attr_name] = attr_value
+            layout = target_layout(obj, compression, compression_level, chunk_frames)
+            if layout == source_layout(obj):
+                # 原生对象复制，连同 dataset 属性一起复制
+                src_group.copy(obj, dst_group, name=name)
+            else:
+                stream_copy_dataset(obj, dst_group, name, layout)
         elif isinstance(obj, h5py.Group):
             # 递归复制子 group
             new_group = dst_group.create_group(name)
-            copy_group(obj, new_group)
+            copy_group(obj, new_group, compression, compression_level, chunk_frames)
+
+
+class SourceFileCache:
+    """
+    在整个 repack 过程中复用已打开的源文件句柄，最多同时打开 max_open 个，超出时关闭最久未使用的
+
+    网络文件系统上每次打开文件都需要多次元数据往返并重新读取 superblock，
+    连续来自同一源文件的 episodes 只需打开一次
+    """
+
+    def __init__(self, max_open: int = 8):
+        self.max_open = max_open
+        self._files: OrderedDict[Path, h5py.File] = OrderedDict()
+
+    def get(self, path: Path) -> h5py.File:
+        f = self._files.get(path)
+        if f is not None:
+            self._files.move_to_end(path)
+            return f
+        f = h5py.File(path, "r")
+        self._files[path] = f
+        while len(self._files) > self.max_open:
+            _, oldest = self._files.popitem(last=False)
+            oldest.close()
+        return f
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_output_file(
+    output_file: Path,
+    batch: list[tuple[Path, str]],
+    sources: SourceFileCache,
+    compression: str = "keep",
+    compression_level: Optional[int] = None,
+    chunk_frames: Optional[int] = None,
+    link: bool = False,
+):
+    """
+    创建一个输出文件并复制其中的 episodes
+
+    Args:
+        output_file: 输出文件路径
+        batch: 按源文件排序的 (源文件, group 名称) 列表
+        sources: 源文件句柄缓存
+        link: 只写入指向源 episode group 的外部链接，不复制数据
+    """
+    with h5py.File(output_file, "w") as out_f:
+        for src_file, group_name in batch:
+            if link:
+                # 链接路径相对于输出文件所在目录，HDF5 解析外部链接时会在该目录下查找
+                out_f[group_name] = h5py.ExternalLink(os.path.relpath(src_file, output_file.parent), f"/{group_name}")
+                continue
+            # 从缓存的源文件句柄复制 group
+            src_group = sources.get(src_file)[group_name]
+            dst_group = out_f.create_group(group_name)
+            copy_group(src_group, dst_group, compression, compression_level, chunk_frames)
+
+
+# 每个 worker 进程在整个 repack 过程中复用的源文件句柄
+_worker_sources: Optional[SourceFileCache] = None
+
+
+def _init_repack_worker(max_open_files: int):
+    global _worker_sources
+    _worker_sources = SourceFileCache(max_open_files)
+
+
+def _write_output_file_in_worker(output_file: Path, batch: list[tuple[Path, str]], *copy_options):
+    write_output_file(output_file, batch, _worker_sources, *copy_options)
 
 
 def collect_episodes_from_directory(
@@ -92,6 +269,12 @@ def repack_hdf5_files(
     pattern: str = typer.Option("*.hdf5", "--pattern", help="输入文件匹配模式"),
     overwrite: bool = typer.Option(False, "--overwrite", help="覆盖已存在的文件"),
     dry_run: bool = typer.Option(False, "--dry-run", help="预览模式，不实际写入文件"),
+    compression: str = typer.Option("keep", "--compression", help="压缩方式：keep 沿用源文件、none、gzip、lzf"),
+    compression_level: Optional[int] = typer.Option(None, "--compression-level", help="gzip 压缩等级（0-9），仅用于 --compression gzip，默认沿用源文件的等级"),
+    chunk_frames: Optional[int] = typer.Option(None, "--chunk-frames", help="沿帧维度的 chunk 长度（默认沿用源文件）"),
+    max_open_files: int = typer.Option(8, "--max-open-files", help="同时保持打开的源文件数量上限"),
+    workers: int = typer.Option(1, "--workers", help="并行写入输出文件的进程数"),
+    link: bool = typer.Option(False, "--link", help="输出文件只包含指向源 episode 的外部链接，不复制数据"),
 ) -> None:
     """
     将目录中的多个 HDF5 文件重新划分成包含指定数量 episodes 的 HDF5 文件
@@ -108,6 +291,25 @@ def repack_hdf5_files(
         typer.echo(f"❌ 输入路径不是目录: {input_dir}", err=True)
         raise typer.Exit(1)
 
+    if compression not in COMPRESSION_CHOICES:
+        typer.echo(f"❌ 不支持的压缩方式: {compression}（可选: {', '.join(COMPRESSION_CHOICES)}）", err=True)
+        raise typer.Exit(1)
+    if compression_level is not None and compression != "gzip":
+        typer.echo("❌ --compression-level 只能与 --compression gzip 同时使用", err=True)
+        raise typer.Exit(1)
+    if chunk_frames is not None and chunk_frames < 1:
+        typer.echo("❌ --chunk-frames 必须大于 0", err=True)
+        raise typer.Exit(1)
+    if max_open_files < 1:
+        typer.echo("❌ --max-open-files 必须大于 0", err=True)
+        raise typer.Exit(1)
+    if workers < 1:
+        typer.echo("❌ --workers 必须大于 0", err=True)
+        raise typer.Exit(1)
+    if link and (compression != "keep" or chunk_frames is not None):
+        typer.echo("❌ --link 不复制数据，不能与 --compression 或 --chunk-frames 同时使用", err=True)
+        raise typer.Exit(1)
+
     # 创建输出目录
     output_path.mkdir(parents=True, exist_ok=True)
 
@@ -150,10 +352,14 @@ def repack_hdf5_files(
 
     episode_names = sorted(episodes.keys())
 
-    for file_idx in tqdm(range(num_output_files), desc="重新打包"):
+    # 确定每个输出文件包含的 episodes，已存在的文件按 --overwrite 决定是否跳过
+    progress = tqdm(total=num_output_files, desc="重新打包")
+    jobs = []
+    for file_idx in range(num_output_files):
         start_idx = file_idx * episodes_per_file
         end_idx = min(start_idx + episodes_per_file, total_episodes)
-        batch_episodes = episode_names[start_idx:end_idx]
+        # 按源文件排序，同一源文件的 episodes 连续复制
+        batch = sorted(episodes[key] for key in episode_names[start_idx:end_idx])
 
         output_filename = f"{prefix}{file_idx}.hdf5"
         output_file = output_path / output_filename
@@ -161,20 +367,36 @@ def repack_hdf5_files(
         # 检查文件是否已存在
         if output_file.exists() and not overwrite:
             typer.echo(f"⚠️  跳过 {output_filename}（文件已存在，使用 --overwrite 覆盖）")
+            progress.update()
             continue
-
-        # 创建新文件并复制 episodes
-        with h5py.File(output_file, "w") as out_f:
-            for episode_key in batch_episodes:
-                src_file, group_name = episodes[episode_key]
-
-                # 打开源文件并复制 group
-                with h5py.File(src_file, "r") as in_f:
-                    src_group = in_f[group_name]
-                    dst_group = out_f.create_group(group_name)
-                    copy_group(src_group, dst_group)
-
-        typer.echo(f"✅ 已保存: {output_filename} ({len(batch_episodes)} episodes)")
+        jobs.append((output_file, batch))
+
+    copy_options = (compression, compression_level, chunk_frames, link)
+    if workers <= 1:
+        with SourceFileCache(max_open_files) as sources:
+            for output_file, batch in jobs:
+                write_output_file(output_file, batch, sources, *copy_options)
+                typer.echo(f"✅ 已保存: {output_file.name} ({len(batch)} episodes)")
+                progress.update()
+    else:
+        # 每个输出文件只由一个 worker 进程写入，不需要 HDF5 写锁
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_repack_worker, initargs=(max_open_files,)
+        ) as pool:
+            futures = {
+                pool.submit(_write_output_file_in_worker, output_file, batch, *copy_options): (output_file, batch)
+                for output_file, batch in jobs
+            }
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    output_file, batch = futures[future]
+                    typer.echo(f"✅ 已保存: {output_file.name} ({len(batch)} episodes)")
+                    progress.update()
+            except BaseException:
+                pool.shutdown(cancel_futures=True)
+                raise
+    progress.close()
 
     typer.echo(f"\n✨ 完成！共生成 {num_output_files} 个文件到 {output_path}")
 
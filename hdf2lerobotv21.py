@@ -1,131 +1,36 @@
 import h5py
-import numpy as np
 import os
-import cv2
-from lerobot.datasets.lerobot_dataset import LeRobotDataset
+import sys
 from tqdm import tqdm
 import typer
 from pathlib import Path
-from typing import Optional, List
+from typing import List, Optional
 
-# feature definition for bi-arm piper data
-BI_PIPER_FEATURES = {
-    "action": {
-        "dtype": "float32",
-        "shape": (14,),
-        "names": [
-            "left_joint_1.pos",
-            "left_joint_2.pos",
-            "left_joint_3.pos",
-            "left_joint_4.pos",
-            "left_joint_5.pos",
-            "left_joint_6.pos",
-            "left_joint_7.pos",
-            "right_joint_1.pos",
-            "right_joint_2.pos",
-            "right_joint_3.pos",
-            "right_joint_4.pos",
-            "right_joint_5.pos",
-            "right_joint_6.pos",
-            "right_joint_7.pos",
-        ],
-    },
-    "observation.state": {
-        "dtype": "float32",
-        "shape": (14,),
-        "names": [
-            "left_joint_1.pos",
-            "left_joint_2.pos",
-            "left_joint_3.pos",
-            "left_joint_4.pos",
-            "left_joint_5.pos",
-            "left_joint_6.pos",
-            "left_joint_7.pos",
-            "right_joint_1.pos",
-            "right_joint_2.pos",
-            "right_joint_3.pos",
-            "right_joint_4.pos",
-            "right_joint_5.pos",
-            "right_joint_6.pos",
-            "right_joint_7.pos",
-        ],
-    },
-    "observation.images.left_wrist": {
-        "dtype": "video",
-        "shape": [480, 640, 3],
-        "names": ["height", "width", "channels"],
-        "video_info": {
-            "video.height": 480,
-            "video.width": 640,
-            "video.codec": "av1",
-            "video.pix_fmt": "yuv420p",
-            "video.is_depth_map": False,
-            "video.fps": 30.0,
-            "video.channels": 3,
-            "has_audio": False,
-        },
-    },
-    "observation.images.mid": {
-        "dtype": "video",
-        "shape": [480, 640, 3],
-        "names": ["height", "width", "channels"],
-        "video_info": {
-            "video.height": 480,
-            "video.width": 640,
-            "video.codec": "av1",
-            "video.pix_fmt": "yuv420p",
-            "video.is_depth_map": False,
-            "video.fps": 30.0,
-            "video.channels": 3,
-            "has_audio": False,
-        },
-    },
-    "observation.images.right_wrist": {
-        "dtype": "video",
-        "shape": [480, 640, 3],
-        "names": ["height", "width", "channels"],
-        "video_info": {
-            "video.height": 480,
-            "video.width": 640,
-            "video.codec": "av1",
-            "video.pix_fmt": "yuv420p",
-            "video.is_depth_map": False,
-            "video.fps": 30.0,
-            "video.channels": 3,
-            "has_audio": False,
-        },
-    },
-}
+# 读取、解码、编码等共用组件位于 convert_parallel/hdf5_conversion.py
+sys.path.insert(0, str(Path(__file__).resolve().parent / "convert_parallel"))
+from hdf5_conversion import (
+    DEFAULT_FRAME_CACHE_GB,
+    DEFAULT_READ_WINDOW,
+    DEFAULT_VIDEO_PROFILE,
+    STRIDE_REDUCTIONS,
+    VIDEO_PROFILES,
+    BiPiperDataset,
+    DecodedFrameCache,
+    EpisodePrefetcher,
+    FrameDecoder,
+    RankProfiler,
+    ReadBuffers,
+    StageTimer,
+    build_features,
+    check_ffmpeg_encoder,
+    list_episodes,
+    parse_resolution,
+    process_data,
+    read_buffer_slots,
+    requires_ffmpeg_cli,
+    resolve_frame_stride,
+)
 
-def process_data(dataset: LeRobotDataset, episode_group: h5py.Group, episode_name: str) -> bool:
-    episode_instruction = episode_group.attrs.get("instruction")
-    episode_frame_length = episode_group.attrs.get("length")
-
-    action = np.array(episode_group["action"])
-    state = np.array(episode_group["state"])
-    image_left_bytes = episode_group["image_left"][()]
-    image_mid_bytes = episode_group["image_mid"][()]
-    image_right_bytes = episode_group["image_right"][()]
-    
-
-    decode = lambda x: x if isinstance(x, np.ndarray) and x.ndim == 3 else cv2.imdecode(np.frombuffer(x, np.uint8), cv2.IMREAD_COLOR)
-    for frame_index in range(episode_frame_length):
-        image_left = decode(image_left_bytes[frame_index])
-        image_mid = decode(image_mid_bytes[frame_index])
-        image_right = decode(image_right_bytes[frame_index])
-
-        frame = {
-            "action": action[frame_index],
-            "observation.state": state[frame_index],
-            "observation.images.left_wrist": image_left,
-            "observation.images.mid": image_mid,
-            "observation.images.right_wrist": image_right,
-            "task": episode_instruction,
-        }
-        dataset.add_frame(frame=frame)
-
-    return True
-            
 
 def convert_hdf5_to_lerobot(
     repo_id: str = typer.Option("12e21/bi_piper_subset", help="HuggingFace repository ID"),
@@ -135,6 +40,23 @@ def convert_hdf5_to_lerobot(
     hdf5_files: Optional[List[str]] = typer.Option(None, help="HDF5 files to process (can be specified multiple times)"),
     all_files: bool = typer.Option(False, "--all", help="Process all HDF5 files in the root directory"),
     push_to_hub: bool = typer.Option(False, "--push", help="Push dataset to HuggingFace Hub"),
+    decode_threads: int = typer.Option(1, help="Number of JPEG decode threads"),
+    read_window: int = typer.Option(DEFAULT_READ_WINDOW, help="Frames read from HDF5 per window, rounded up to the chunk size"),
+    prefetch_depth: int = typer.Option(0, help="Decoded frame batches to prefetch while the previous episode is encoded (0 disables pipelining)"),
+    video_profile: str = typer.Option(DEFAULT_VIDEO_PROFILE, help=f"Video encoding profile: {', '.join(sorted(VIDEO_PROFILES))} (profiles other than {DEFAULT_VIDEO_PROFILE} use the ffmpeg CLI)"),
+    encode_workers: Optional[int] = typer.Option(None, help="Camera videos encoded concurrently per episode (default: one per camera)"),
+    stream_video: bool = typer.Option(False, "--stream-video", help="Pipe decoded frames straight into one ffmpeg encoder per camera instead of temporary PNG files"),
+    jpeg_passthrough: bool = typer.Option(False, "--jpeg-passthrough", help="Feed the stored JPEG bytes to the encoder as MJPEG input and only decode frames sampled for stats (implies --stream-video)"),
+    target_resolution: Optional[str] = typer.Option(None, help="Store camera frames at HEIGHTxWIDTH (e.g. 240x320) using reduced JPEG decode and resize (default: source resolution)"),
+    target_fps: Optional[int] = typer.Option(None, help="Write the dataset at this fps by keeping every (fps / target-fps)-th frame; must divide --fps"),
+    frame_stride: Optional[int] = typer.Option(None, help="Keep every N-th frame and write the dataset at fps / N (alternative to --target-fps)"),
+    stride_reduce: str = typer.Option("sample", help=f"How action/state are reduced over each stride window: {', '.join(STRIDE_REDUCTIONS)}"),
+    frame_cache_dir: Optional[str] = typer.Option(None, help="Directory for the on-disk decoded frame cache (default: disabled)"),
+    frame_cache_gb: float = typer.Option(DEFAULT_FRAME_CACHE_GB, help="Size cap of the decoded frame cache in GB, least recently used episodes are evicted first"),
+    timing_dir: Optional[str] = typer.Option(None, help="Write per-stage timing (rank_00000.json/.csv) to this directory, merge with convert_parallel/merge_stage_timing.py"),
+    profile: bool = typer.Option(False, "--profile", help="Profile the conversion and write rank_00000.pstats/.collapsed to --profile-dir"),
+    profile_dir: str = typer.Option("./profile", help="Directory for the --profile output"),
+    profile_episodes: Optional[int] = typer.Option(None, help="Only profile the first N episodes (default: all)"),
 ) -> None:
     """
     Convert HDF5 files to LeRobot dataset format.
@@ -148,19 +70,90 @@ def convert_hdf5_to_lerobot(
     else:
         typer.echo("Error: Please specify --hdf5-files or use --all to process all files", err=True)
         raise typer.Exit(1)
-    dataset = LeRobotDataset.create(
+    if video_profile not in VIDEO_PROFILES:
+        typer.echo(f"Error: Unknown video profile '{video_profile}', choose from {', '.join(sorted(VIDEO_PROFILES))}", err=True)
+        raise typer.Exit(1)
+    if requires_ffmpeg_cli(video_profile, stream_video or jpeg_passthrough):
+        try:
+            check_ffmpeg_encoder(VIDEO_PROFILES[video_profile]["vcodec"])
+        except RuntimeError as e:
+            typer.echo(f"Error: {e}", err=True)
+            raise typer.Exit(1)
+    resolution = None
+    if target_resolution is not None:
+        try:
+            resolution = parse_resolution(target_resolution)
+        except ValueError:
+            typer.echo(f"Error: Invalid target resolution '{target_resolution}', expected HEIGHTxWIDTH", err=True)
+            raise typer.Exit(1)
+    if stride_reduce not in STRIDE_REDUCTIONS:
+        typer.echo(f"Error: Unknown stride reduction '{stride_reduce}', choose from {', '.join(STRIDE_REDUCTIONS)}", err=True)
+        raise typer.Exit(1)
+    try:
+        frame_stride = resolve_frame_stride(fps, target_fps, frame_stride)
+    except ValueError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+    if profile_episodes is not None and profile_episodes < 1:
+        typer.echo("Error: --profile-episodes must be at least 1", err=True)
+        raise typer.Exit(1)
+    dataset = BiPiperDataset.create(
         repo_id=repo_id,
-        fps=fps,
+        fps=fps // frame_stride,
         robot_type=robot_type,
-        features=BI_PIPER_FEATURES,
+        features=build_features(video_profile, resolution, fps // frame_stride),
     )
+    dataset.configure_encoding(video_profile, encode_workers, os.cpu_count() or 0, stream_video, jpeg_passthrough)
 
-    for hdf5_file in tqdm(hdf5_files, desc="Processing HDF5 files"):
-        with h5py.File(hdf5_file, "r") as f:
-            for episode_name in tqdm(f.keys(), desc="Processing episodes"):
-                episode_group = f[episode_name]
-                process_data(dataset, episode_group, episode_name)
-                dataset.save_episode()
+    timer = StageTimer() if timing_dir else None
+    dataset.timer = timer
+    decoder = FrameDecoder(num_threads=decode_threads, resolution=resolution, timer=timer)
+    buffers = ReadBuffers(read_buffer_slots(decoder, read_window, frame_stride=frame_stride), timer)
+    cache = DecodedFrameCache(frame_cache_dir, int(frame_cache_gb * 1024**3)) if frame_cache_dir else None
+    profiler = RankProfiler(Path(profile_dir) / "rank_00000", profile_episodes) if profile else None
+    if profiler is not None:
+        profiler.start()
+    try:
+        if prefetch_depth > 0:
+            episodes = list_episodes(hdf5_files)
+            with EpisodePrefetcher(
+                episodes, decoder, read_window, prefetch_depth, jpeg_passthrough, frame_stride, stride_reduce, cache, timer
+            ) as prefetcher:
+                for hdf5_file, episode_name, length, episode in tqdm(prefetcher, total=len(episodes), desc="Processing episodes"):
+                    dataset.begin_episode(length)
+                    dataset.add_episode_arrays(**episode)
+                    dataset.save_episode()
+                    if timer is not None:
+                        timer.end_episode(hdf5_file, episode_name)
+                    if profiler is not None:
+                        profiler.end_episode()
+        else:
+            for hdf5_file in tqdm(hdf5_files, desc="Processing HDF5 files"):
+                with h5py.File(hdf5_file, "r") as f:
+                    for episode_name in tqdm(f.keys(), desc="Processing episodes"):
+                        episode_group = f[episode_name]
+                        process_data(
+                            dataset,
+                            episode_group,
+                            episode_name,
+                            decoder=decoder,
+                            read_window=read_window,
+                            frame_stride=frame_stride,
+                            stride_reduce=stride_reduce,
+                            buffers=buffers,
+                            cache=cache,
+                        )
+                        dataset.save_episode()
+                        if timer is not None:
+                            timer.end_episode(hdf5_file, episode_name)
+                        if profiler is not None:
+                            profiler.end_episode()
+    finally:
+        decoder.close()
+        if timer is not None:
+            timer.write(Path(timing_dir) / "rank_00000", rank=0, shard=repo_id)
+        if profiler is not None:
+            profiler.stop()
 
     if push_to_hub:
         dataset.push_to_hub()
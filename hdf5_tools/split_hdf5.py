@@ -5,44 +5,15 @@
 """
 
 import h5py
-import numpy as np
+import sys
 from pathlib import Path
 import typer
 from typing import Optional, List
 from tqdm import tqdm
 
-
-def copy_group(src_group: h5py.Group, dst_group: h5py.Group):
-    """
-    递归复制 HDF5 group 及其所有 datasets 和子 groups
-
-    Args:
-        src_group: 源 group
-        dst_group: 目标 group
-    """
-    # 复制属性
-    for attr_name, attr_value in src_group.attrs.items():
-        dst_group.attrs[attr_name] = attr_value
-
-    # 复制所有内容
-    for name, obj in src_group.items():
-        if isinstance(obj, h5py.Dataset):
-            # 复制 dataset
-            dst_group.create_dataset(
-                name,
-                data=obj[()],
-                dtype=obj.dtype,
-                compression=obj.compression,
-                compression_opts=obj.compression_opts,
-                shuffle=obj.shuffle,
-            )
-            # 复制 dataset 属性
-            for attr_name, attr_value in obj.attrs.items():
-                dst_group[name].attrs[attr_name] = attr_value
-        elif isinstance(obj, h5py.Group):
-            # 递归复制子 group
-            new_group = dst_group.create_group(name)
-            copy_group(obj, new_group)
+# chunk 与过滤器设置、原生对象复制与流式复制位于 convert_parallel/repack_hdf5.py，与 repack 共用
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "convert_parallel"))
+from repack_hdf5 import COMPRESSION_CHOICES, copy_group
 
 
 def split_hdf5_file(
@@ -51,6 +22,9 @@ def split_hdf5_file(
     prefix: str = typer.Option("", "--prefix", help="输出文件名前缀"),
     groups: Optional[List[str]] = typer.Option(None, help="指定要拆分的 group 名称（可多次使用，未指定则拆分所有）"),
     overwrite: bool = typer.Option(False, "--overwrite", help="覆盖已存在的文件"),
+    compression: str = typer.Option("keep", "--compression", help="压缩方式：keep 沿用源文件、none、gzip、lzf"),
+    compression_level: Optional[int] = typer.Option(None, "--compression-level", help="gzip 压缩等级（0-9），仅用于 --compression gzip，默认沿用源文件的等级"),
+    chunk_frames: Optional[int] = typer.Option(None, "--chunk-frames", help="沿帧维度的 chunk 长度（默认沿用源文件）"),
 ) -> None:
     """
     将包含多个 group 的 HDF5 文件拆分成多个单独的 HDF5 文件
@@ -64,6 +38,16 @@ def split_hdf5_file(
         typer.echo(f"❌ 输入文件不存在: {input_file}", err=True)
         raise typer.Exit(1)
 
+    if compression not in COMPRESSION_CHOICES:
+        typer.echo(f"❌ 不支持的压缩方式: {compression}（可选: {', '.join(COMPRESSION_CHOICES)}）", err=True)
+        raise typer.Exit(1)
+    if compression_level is not None and compression != "gzip":
+        typer.echo("❌ --compression-level 只能与 --compression gzip 同时使用", err=True)
+        raise typer.Exit(1)
+    if chunk_frames is not None and chunk_frames < 1:
+        typer.echo("❌ --chunk-frames 必须大于 0", err=True)
+        raise typer.Exit(1)
+
     # 创建输出目录
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
@@ -109,7 +93,7 @@ def split_hdf5_file(
             with h5py.File(output_file, "w") as out_f:
                 # 创建根 group（使用原 group 名称）
                 dst_group = out_f.create_group(group_name)
-                copy_group(src_group, dst_group)
+                copy_group(src_group, dst_group, compression, compression_level, chunk_frames)
 
             typer.echo(f"✅ 已保存: {output_filename}")
 
@@ -0,0 +1,56 @@
+"""
+add_episode_arrays 的输入检查：图像与 features 不符时在写入 PNG 之前报错
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("lerobot")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "convert_parallel"))
+from hdf5_conversion import DEFAULT_VIDEO_PROFILE, BiPiperDataset, build_features  # noqa: E402
+
+
+HEIGHT, WIDTH = 24, 32
+LENGTH = 3
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    return BiPiperDataset.create(
+        repo_id="test/add_episode_arrays",
+        fps=30,
+        features=build_features(DEFAULT_VIDEO_PROFILE, (HEIGHT, WIDTH), 30),
+        root=tmp_path / "dataset",
+    )
+
+
+def add_episode(dataset: BiPiperDataset, image: np.ndarray, camera_keys=None):
+    values = np.zeros((LENGTH, 14), dtype=np.float32)
+    camera_keys = dataset.meta.camera_keys if camera_keys is None else camera_keys
+    images = {key: iter([image] * LENGTH) for key in camera_keys}
+    dataset.add_episode_arrays(values, values, images, "pick")
+
+
+def test_accepts_matching_images(dataset):
+    add_episode(dataset, np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8))
+    assert dataset.episode_buffer["size"] == LENGTH
+
+
+@pytest.mark.parametrize(
+    "image",
+    [np.zeros((HEIGHT * 2, WIDTH, 3), dtype=np.uint8), np.zeros((HEIGHT, WIDTH, 3), dtype=np.float32)],
+    ids=["shape", "dtype"],
+)
+def test_rejects_mismatched_images(dataset, image):
+    with pytest.raises(ValueError, match="expected uint8"):
+        add_episode(dataset, image)
+    assert not list(dataset.root.glob("images/**/*.png"))
+
+
+def test_rejects_unknown_camera(dataset):
+    with pytest.raises(ValueError, match="Unknown camera"):
+        add_episode(dataset, np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8), ["observation.images.top"])
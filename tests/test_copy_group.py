@@ -0,0 +1,93 @@
+"""
+repack 与 split 共用的 copy_group：布局不变时原生复制原样保留 chunk、过滤器与属性，
+修改布局时流式复制，变长 JPEG dataset 逐字节一致
+"""
+
+import sys
+from pathlib import Path
+
+import h5py
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "convert_parallel"))
+from repack_hdf5 import copy_group, source_layout  # noqa: E402
+
+
+LENGTH = 40
+CHUNK_FRAMES = 8
+
+
+@pytest.fixture
+def source(tmp_path):
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, int(rng.integers(1, 3000)), dtype=np.uint8) for _ in range(LENGTH)]
+    path = tmp_path / "source.hdf5"
+    with h5py.File(path, "w") as f:
+        group = f.create_group("episode_0")
+        group.attrs["length"] = LENGTH
+        group.attrs["task"] = "pick"
+        action = group.create_dataset(
+            "action",
+            data=rng.random((LENGTH, 14), dtype=np.float32),
+            chunks=(CHUNK_FRAMES, 14),
+            compression="gzip",
+            compression_opts=4,
+            shuffle=True,
+        )
+        action.attrs["unit"] = "rad"
+        image = group.create_dataset(
+            "image_left", (LENGTH,), dtype=h5py.vlen_dtype(np.uint8), chunks=(CHUNK_FRAMES,), compression="lzf"
+        )
+        for i, frame in enumerate(frames):
+            image[i] = frame
+        image.attrs["encoding"] = "jpeg"
+        group.create_group("meta").create_dataset("fps", data=30)
+    return path, frames
+
+
+def copy_episode(source_path: Path, target_path: Path, **kwargs):
+    with h5py.File(source_path, "r") as src, h5py.File(target_path, "w") as dst:
+        copy_group(src["episode_0"], dst.create_group("episode_0"), **kwargs)
+
+
+def test_native_copy_keeps_layout_and_chunks(tmp_path, source):
+    source_path, _ = source
+    copy_episode(source_path, tmp_path / "target.hdf5")
+
+    with h5py.File(source_path, "r") as src, h5py.File(tmp_path / "target.hdf5", "r") as dst:
+        assert dict(dst["episode_0"].attrs) == dict(src["episode_0"].attrs)
+        assert dst["episode_0/meta/fps"][()] == 30
+        action_src, action_dst = src["episode_0/action"], dst["episode_0/action"]
+        assert source_layout(action_dst) == source_layout(action_src)
+        assert dict(action_dst.attrs) == dict(action_src.attrs)
+        # 压缩后的 chunk 原样搬运，不重新压缩
+        for i in range(action_src.id.get_num_chunks()):
+            offset = action_src.id.get_chunk_info(i).chunk_offset
+            assert action_dst.id.read_direct_chunk(offset) == action_src.id.read_direct_chunk(offset)
+        np.testing.assert_array_equal(action_dst[()], action_src[()])
+        assert source_layout(dst["episode_0/image_left"]) == source_layout(src["episode_0/image_left"])
+        assert dict(dst["episode_0/image_left"].attrs) == dict(src["episode_0/image_left"].attrs)
+
+
+@pytest.mark.parametrize(
+    "kwargs,compression,chunks",
+    [
+        ({"compression": "none"}, None, (CHUNK_FRAMES,)),
+        ({"compression": "gzip", "compression_level": 1}, "gzip", (CHUNK_FRAMES,)),
+        ({"chunk_frames": 5}, "lzf", (5,)),
+    ],
+    ids=["none", "gzip", "chunk-frames"],
+)
+def test_streamed_copy_round_trips_jpeg_frames(tmp_path, source, kwargs, compression, chunks):
+    source_path, frames = source
+    copy_episode(source_path, tmp_path / "target.hdf5", **kwargs)
+
+    with h5py.File(source_path, "r") as src, h5py.File(tmp_path / "target.hdf5", "r") as dst:
+        image = dst["episode_0/image_left"]
+        assert image.compression == compression
+        assert image.chunks == chunks
+        assert h5py.check_vlen_dtype(image.dtype) == np.uint8
+        assert dict(image.attrs) == {"encoding": "jpeg"}
+        assert [bytes(frame) for frame in image[()]] == [frame.tobytes() for frame in frames]
+        np.testing.assert_array_equal(dst["episode_0/action"][()], src["episode_0/action"][()])
@@ -0,0 +1,56 @@
+"""
+LPT 调度使用的 episode 代价：缺少 length 属性时按字节数估计，字节数必须以 JPEG 数据为主
+"""
+
+import sys
+from pathlib import Path
+
+import h5py
+import numpy as np
+import pytest
+
+pytest.importorskip("datatrove")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "convert_parallel"))
+from convert_hdf5_shards import estimate_episode_costs  # noqa: E402
+from hdf5_conversion import CAMERA_DATASETS  # noqa: E402
+
+
+def write_episode(group: h5py.Group, length: int, frame_bytes: int, with_length: bool = True) -> int:
+    """写入一个 JPEG 大小固定的 episode，返回相机数据的总字节数"""
+    rng = np.random.default_rng(length)
+    group["action"] = rng.random((length, 14), dtype=np.float32)
+    group["state"] = rng.random((length, 14), dtype=np.float32)
+    for name in CAMERA_DATASETS:
+        ds = group.create_dataset(name, (length,), dtype=h5py.vlen_dtype(np.uint8), chunks=(8,))
+        for i in range(length):
+            ds[i] = rng.integers(0, 256, frame_bytes, dtype=np.uint8)
+    if with_length:
+        group.attrs["length"] = length
+    return length * frame_bytes * len(CAMERA_DATASETS)
+
+
+def test_costs_use_frame_counts(tmp_path):
+    path = str(tmp_path / "episodes.hdf5")
+    with h5py.File(path, "w") as f:
+        write_episode(f.create_group("episode_0"), 20, 1000)
+        write_episode(f.create_group("episode_1"), 30, 100)
+
+    costs, unit = estimate_episode_costs([path])
+    assert unit == "frames"
+    assert costs == {(path, "episode_0"): 20, (path, "episode_1"): 30}
+
+
+def test_byte_costs_count_jpeg_bytes(tmp_path):
+    path = str(tmp_path / "episodes.hdf5")
+    with h5py.File(path, "w") as f:
+        # 帧数更少但 JPEG 更大的 episode 代价必须更高
+        large = write_episode(f.create_group("episode_0"), 20, 5000)
+        small = write_episode(f.create_group("episode_1"), 40, 200, with_length=False)
+
+    costs, unit = estimate_episode_costs([path])
+    assert unit == "bytes"
+    arrays = 2 * 14 * 4
+    assert costs[(path, "episode_0")] == large + 20 * arrays
+    assert costs[(path, "episode_1")] == small + 40 * arrays
+    assert costs[(path, "episode_0")] > costs[(path, "episode_1")]
@@ -0,0 +1,158 @@
+"""
+repack_hdf5 的回归测试：源文件句柄缓存按 --max-open-files 淘汰最久未使用的文件，输出与源 episodes 一致，
+多进程写入的输出与单进程相同，--link 输出在其他工作目录下也能被转换流程读取
+"""
+
+import sys
+from pathlib import Path
+
+import h5py
+import numpy as np
+import pytest
+from typer.testing import CliRunner
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "convert_parallel"))
+from hdf5_conversion import iter_episode_groups, list_episodes  # noqa: E402
+from repack_hdf5 import SourceFileCache, app, source_layout  # noqa: E402
+from test_strided_reads import HEIGHT, WIDTH, write_hdf5  # noqa: E402
+
+
+NUM_FILES = 3
+EPISODES_PER_SOURCE = 3
+EPISODES_PER_FILE = 2
+
+
+def write_sources(input_dir: Path) -> dict:
+    """写入若干源文件，返回 {(源文件名, episode): (action, JPEG 帧)}"""
+    rng = np.random.default_rng(0)
+    input_dir.mkdir()
+    episodes = {}
+    for file_index in range(NUM_FILES):
+        with h5py.File(input_dir / f"source_{file_index}.hdf5", "w") as f:
+            for episode_index in range(EPISODES_PER_SOURCE):
+                length = int(rng.integers(5, 15))
+                group = f.create_group(f"episode_{episode_index}")
+                group.attrs["length"] = length
+                action = rng.random((length, 14), dtype=np.float32)
+                group["action"] = action
+                # 至少 2 字节：h5py 写入单字节的变长行时会发出 numpy 标量转换的 DeprecationWarning
+                frames = [rng.integers(0, 256, int(rng.integers(2, 500)), dtype=np.uint8) for _ in range(length)]
+                image = group.create_dataset("image_left", (length,), dtype=h5py.vlen_dtype(np.uint8), chunks=(4,))
+                for i, frame in enumerate(frames):
+                    image[i] = frame
+                episodes[(f"source_{file_index}", group.name.lstrip("/"))] = (action, frames)
+    return episodes
+
+
+def repack(input_dir: Path, output_dir: Path, *options: str):
+    return CliRunner().invoke(
+        app,
+        ["repack", "-i", str(input_dir), "-o", str(output_dir), "-e", str(EPISODES_PER_FILE), "--overwrite", *options],
+    )
+
+
+def read_output(output_dir: Path) -> list:
+    """按输出文件顺序读出各文件的 {group 名称: (action, JPEG 帧)}"""
+    outputs = []
+    for path in sorted(output_dir.glob("*.hdf5"), key=lambda p: int(p.stem.rsplit("_", 1)[1])):
+        with h5py.File(path, "r") as f:
+            outputs.append(
+                {name: (group["action"][()], [bytes(frame) for frame in group["image_left"][()]]) for name, group in f.items()}
+            )
+    return outputs
+
+
+def assert_output_matches(output_dir: Path, sources: dict):
+    # 源 episodes 按 "<源文件名>/<group>" 排序后每 EPISODES_PER_FILE 个写入一个输出文件
+    keys = sorted(sources)
+    outputs = read_output(output_dir)
+    assert len(outputs) == (len(keys) + EPISODES_PER_FILE - 1) // EPISODES_PER_FILE
+    for file_index, output in enumerate(outputs):
+        batch = keys[file_index * EPISODES_PER_FILE : (file_index + 1) * EPISODES_PER_FILE]
+        assert sorted(output) == sorted(name for _, name in batch)
+        for key in batch:
+            action, frames = output[key[1]]
+            np.testing.assert_array_equal(action, sources[key][0])
+            assert frames == [frame.tobytes() for frame in sources[key][1]]
+
+
+def test_source_cache_evicts_least_recently_used(tmp_path):
+    write_sources(tmp_path / "input")
+    paths = sorted((tmp_path / "input").glob("*.hdf5"))
+    with SourceFileCache(max_open=2) as sources:
+        first = sources.get(paths[0])
+        second = sources.get(paths[1])
+        # 再次访问同一文件复用句柄，并使其成为最近使用的文件
+        assert sources.get(paths[0]) is first
+        sources.get(paths[2])
+        assert not second.id.valid
+        assert first.id.valid
+        assert list(sources._files) == [paths[0], paths[2]]
+    assert not first.id.valid
+
+
+@pytest.mark.parametrize("max_open_files", ["1", "8"])
+def test_repack_copies_episodes(tmp_path, max_open_files):
+    sources = write_sources(tmp_path / "input")
+    result = repack(tmp_path / "input", tmp_path / "output", "--max-open-files", max_open_files)
+    assert result.exit_code == 0, result.output
+    assert_output_matches(tmp_path / "output", sources)
+
+
+@pytest.mark.parametrize("options", [(), ("--compression", "gzip", "--chunk-frames", "3")], ids=["native", "streamed"])
+def test_parallel_repack_matches_serial(tmp_path, options):
+    sources = write_sources(tmp_path / "input")
+    for workers in ("1", "2"):
+        result = repack(tmp_path / "input", tmp_path / f"output_{workers}", "--workers", workers, *options)
+        assert result.exit_code == 0, result.output
+
+    serial, parallel = tmp_path / "output_1", tmp_path / "output_2"
+    assert sorted(p.name for p in parallel.glob("*.hdf5")) == sorted(p.name for p in serial.glob("*.hdf5"))
+    assert_output_matches(parallel, sources)
+    for path in serial.glob("*.hdf5"):
+        with h5py.File(path, "r") as expected, h5py.File(parallel / path.name, "r") as actual:
+            assert list(actual) == list(expected)
+            for name, group in expected.items():
+                assert dict(actual[name].attrs) == dict(group.attrs)
+                for key, ds in group.items():
+                    assert source_layout(actual[name][key]) == source_layout(ds)
+
+
+def test_link_output_feeds_conversion_from_other_directory(tmp_path, monkeypatch):
+    pytest.importorskip("lerobot")
+    from hdf5_conversion import DEFAULT_VIDEO_PROFILE, BiPiperDataset, build_features, process_data
+
+    (tmp_path / "input").mkdir()
+    for file_index in range(2):
+        write_hdf5(tmp_path / "input" / f"source_{file_index}.hdf5", jpeg=True, lengths=(5, 7))
+    # 相对路径的输入与输出目录，链接按输出文件所在目录解析，与当前工作目录无关
+    monkeypatch.chdir(tmp_path)
+    result = repack(Path("input"), Path("output"), "--link")
+    assert result.exit_code == 0, result.output
+
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+    output_files = sorted(str(p) for p in (tmp_path / "output").glob("*.hdf5"))
+    episodes = list_episodes(output_files)
+    assert len(episodes) == 4
+    for hdf5_file, episode_name in episodes:
+        with h5py.File(hdf5_file, "r") as f:
+            assert isinstance(f.get(episode_name, getlink=True), h5py.ExternalLink)
+
+    features = build_features(DEFAULT_VIDEO_PROFILE, (HEIGHT, WIDTH), 30)
+    dataset = BiPiperDataset.create(repo_id="test/link", fps=30, features=features, root=tmp_path / "dataset")
+    for _, episode_name, group in iter_episode_groups(episodes):
+        assert process_data(dataset, group, episode_name)
+        assert dataset.episode_buffer["size"] == group.attrs["length"]
+        np.testing.assert_array_equal(np.asarray(dataset.episode_buffer["action"]), group["action"][()])
+        dataset.clear_episode_buffer()
+
+
+@pytest.mark.parametrize("options", [("--compression", "gzip"), ("--chunk-frames", "4")], ids=["compression", "chunk-frames"])
+def test_link_rejects_copy_options(tmp_path, options):
+    write_sources(tmp_path / "input")
+    result = repack(tmp_path / "input", tmp_path / "output", "--link", *options)
+    assert result.exit_code == 1
+    assert "--link" in result.output
+    assert not (tmp_path / "output").exists()
@@ -0,0 +1,80 @@
+"""
+断点续转：清单以真实路径记录 hdf5 文件，换一种 --hdf5-root 写法续转时已提交的 episodes 仍会被跳过
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("datatrove")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "convert_parallel"))
+import convert_hdf5_shards  # noqa: E402
+from convert_hdf5_shards import (  # noqa: E402
+    EpisodeWorkQueue,
+    ShardManifest,
+    make_convert_executor,
+    shard_repo_id_for,
+)
+
+
+REPO_ID = "test/manifest"
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(convert_hdf5_shards, "HF_LEROBOT_HOME", tmp_path / "lerobot")
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "a.hdf5").touch()
+    (tmp_path / "link").symlink_to(data)
+    monkeypatch.chdir(tmp_path)
+    return data
+
+
+def commit_episodes(shard_root: Path, hdf5_file: str, episode_names):
+    """模拟一个已保存这些 episodes 的 shard"""
+    (shard_root / "meta").mkdir(parents=True)
+    (shard_root / "meta" / "info.json").write_text(json.dumps({"total_episodes": len(episode_names)}))
+    manifest = ShardManifest(shard_root)
+    for episode_index, episode_name in enumerate(episode_names):
+        manifest.append(episode_index, hdf5_file, episode_name)
+
+
+@pytest.mark.parametrize("root", ["data", "data/", "link", "ABSOLUTE"], ids=["relative", "trailing-slash", "symlink", "absolute"])
+def test_resume_matches_other_root_spellings(tmp_path, data_dir, root):
+    # 第一次运行使用绝对路径，续转时换一种写法，文件列表的拼法与 main 中一致
+    commit_episodes(
+        convert_hdf5_shards.HF_LEROBOT_HOME / shard_repo_id_for(REPO_ID, 1, 0), str(data_dir / "a.hdf5"), ["episode_0"]
+    )
+    hdf5_root = Path(str(data_dir) if root == "ABSOLUTE" else root)
+    hdf5_file = str(hdf5_root / "a.hdf5")
+
+    make_convert_executor(
+        hdf5_files=[hdf5_file],
+        repo_id=REPO_ID,
+        robot_type="bi_piper",
+        fps=30,
+        job_name="job",
+        logs_dir=tmp_path / "logs",
+        workers=1,
+        partition=None,
+        cpus_per_task=1,
+        mem_per_cpu=None,
+        episode_costs={(hdf5_file, "episode_0"): 20, (hdf5_file, "episode_1"): 10},
+        schedule="dynamic",
+        resume=True,
+        slurm=False,
+    )
+    assert list(EpisodeWorkQueue(str(tmp_path / "logs" / "job" / "work_queue"))) == [(hdf5_file, "episode_1")]
+
+
+def test_manifest_records_real_paths(tmp_path, data_dir):
+    commit_episodes(tmp_path / "shard", os.path.join("link", "a.hdf5"), ["episode_0", "episode_1"])
+    expected = [(str(data_dir.resolve() / "a.hdf5"), "episode_0"), (str(data_dir.resolve() / "a.hdf5"), "episode_1")]
+    assert ShardManifest(tmp_path / "shard").load() == expected
+    records = [json.loads(line) for line in (tmp_path / "shard" / "meta" / ShardManifest.FILENAME).read_text().splitlines()]
+    assert [record["hdf5_file"] for record in records] == [expected[0][0]] * 2
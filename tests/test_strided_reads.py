@@ -0,0 +1,125 @@
+"""
+抽帧读取的回归测试：复用读取缓冲区和预取时，逐帧输出必须与直接 ds[i] 读取一致
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import h5py
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "convert_parallel"))
+from hdf5_conversion import (  # noqa: E402
+    CAMERA_DATASETS,
+    EpisodePrefetcher,
+    FrameDecoder,
+    ReadBuffers,
+    read_buffer_slots,
+    read_episode,
+)
+
+
+HEIGHT, WIDTH = 24, 32
+READ_WINDOW = 8
+CHUNK_FRAMES = 4
+DECODE_THREADS = 8
+
+
+def make_frame(rng: np.random.Generator) -> np.ndarray:
+    return rng.integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+
+
+def write_hdf5(path: Path, jpeg: bool, lengths=(37, 50)) -> Path:
+    """写入与录制数据结构一致的小文件，每帧内容不同"""
+    rng = np.random.default_rng(0)
+    with h5py.File(path, "w") as f:
+        for episode_index, length in enumerate(lengths):
+            group = f.create_group(f"episode_{episode_index}")
+            group.attrs["length"] = length
+            group.attrs["instruction"] = "pick"
+            group["action"] = rng.random((length, 14), dtype=np.float32)
+            group["state"] = rng.random((length, 14), dtype=np.float32)
+            for name in CAMERA_DATASETS:
+                frames = [make_frame(rng) for _ in range(length)]
+                if jpeg:
+                    ds = group.create_dataset(
+                        name, (length,), dtype=h5py.vlen_dtype(np.uint8), chunks=(CHUNK_FRAMES,)
+                    )
+                    for i, frame in enumerate(frames):
+                        ds[i] = cv2.imencode(".jpg", frame)[1].reshape(-1)
+                else:
+                    group.create_dataset(name, data=np.stack(frames), chunks=(CHUNK_FRAMES, HEIGHT, WIDTH, 3))
+    return path
+
+
+def expected_frames(group: h5py.Group, name: str, frame_stride: int):
+    """直接按下标读取，返回 [(解码图像, 原始字节或 None)]"""
+    ds = group[name]
+    frames = []
+    for i in range(0, int(group.attrs["length"]), frame_stride):
+        raw = ds[i]
+        if raw.ndim == 1:
+            frames.append((cv2.imdecode(raw, cv2.IMREAD_COLOR), raw.tobytes()))
+        else:
+            frames.append((raw, None))
+    return frames
+
+
+def check_episode(group: h5py.Group, episode: dict, frame_stride: int, passthrough: bool):
+    camera_keys = list(CAMERA_DATASETS.values())
+    expected = [expected_frames(group, name, frame_stride) for name in CAMERA_DATASETS]
+    streams = [episode["images"][key] for key in camera_keys]
+    if passthrough:
+        streams += [episode["encoded_images"][key] for key in camera_keys]
+
+    num_frames = 0
+    for frame_index, row in enumerate(zip(*streams)):
+        for camera, (name, frames) in enumerate(zip(CAMERA_DATASETS, expected)):
+            image, raw = frames[frame_index]
+            if passthrough:
+                assert bytes(row[len(camera_keys) + camera]) == raw, f"{name} frame {frame_index} bytes differ"
+            else:
+                np.testing.assert_array_equal(row[camera], image, err_msg=f"{name} frame {frame_index}")
+        num_frames += 1
+    assert num_frames == len(expected[0])
+    assert len(episode["action"]) == num_frames
+    np.testing.assert_array_equal(episode["action"], group["action"][::frame_stride])
+
+
+@pytest.mark.parametrize("frame_stride", [1, 2, 4])
+@pytest.mark.parametrize("jpeg,passthrough", [(True, False), (True, True), (False, False)])
+def test_serial_read_matches_direct_read(tmp_path, frame_stride, jpeg, passthrough):
+    path = write_hdf5(tmp_path / "episodes.hdf5", jpeg)
+    decoder = FrameDecoder(num_threads=DECODE_THREADS)
+    buffers = ReadBuffers(read_buffer_slots(decoder, READ_WINDOW, frame_stride=frame_stride))
+    try:
+        with h5py.File(path, "r") as f:
+            for episode_name in f.keys():
+                group = f[episode_name]
+                episode = read_episode(group, decoder, READ_WINDOW, passthrough, frame_stride, buffers=buffers)
+                check_episode(group, episode, frame_stride, passthrough)
+    finally:
+        decoder.close()
+
+
+@pytest.mark.parametrize("frame_stride", [1, 2, 4])
+@pytest.mark.parametrize("jpeg,passthrough", [(True, False), (True, True), (False, False)])
+def test_prefetch_matches_direct_read(tmp_path, frame_stride, jpeg, passthrough):
+    path = write_hdf5(tmp_path / "episodes.hdf5", jpeg)
+    decoder = FrameDecoder(num_threads=DECODE_THREADS)
+    episodes = [(str(path), "episode_0"), (str(path), "episode_1")]
+    try:
+        with h5py.File(path, "r") as f, EpisodePrefetcher(
+            episodes, decoder, READ_WINDOW, 4, passthrough, frame_stride
+        ) as prefetcher:
+            for _, episode_name, _, episode in prefetcher:
+                # 等预取线程填满队列，让在途的读取结果最多
+                deadline = time.monotonic() + 5
+                while not prefetcher._queue.full() and prefetcher._thread.is_alive() and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                check_episode(f[episode_name], episode, frame_stride, passthrough)
+    finally:
+        decoder.close()
@@ -0,0 +1,81 @@
+"""
+变长 JPEG 字节的读取：直接从全局堆读出的 PackedFrames 必须与 h5py 逐行读取的结果一致，
+episode 的数据字节数必须包含全局堆中的 JPEG 字节
+"""
+
+import sys
+from pathlib import Path
+
+import h5py
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "convert_parallel"))
+from hdf5_conversion import (  # noqa: E402
+    episode_storage_size,
+    is_direct_vlen_readable,
+    read_vlen_frames,
+)
+
+
+LENGTH = 45
+CHUNK_FRAMES = 8
+
+
+def random_frames(rng: np.random.Generator, length: int = LENGTH):
+    """长度各不相同的字节串，其中夹一个空帧"""
+    frames = [rng.integers(0, 256, int(rng.integers(1, 5000)), dtype=np.uint8) for _ in range(length)]
+    frames[length // 2] = np.empty(0, dtype=np.uint8)
+    return frames
+
+
+def write_camera(group: h5py.Group, frames, per_row: bool, **kwargs) -> None:
+    """写入一个变长 JPEG 相机 dataset，逐行写入或整体写入"""
+    ds = group.create_dataset(
+        "image_left", (len(frames),), dtype=h5py.vlen_dtype(np.uint8), chunks=(CHUNK_FRAMES,), **kwargs
+    )
+    if per_row:
+        for i, frame in enumerate(frames):
+            ds[i] = frame
+    else:
+        rows = np.empty(len(frames), dtype=object)
+        rows[:] = frames
+        ds[:] = rows
+
+
+@pytest.mark.parametrize(
+    "per_row,kwargs,direct",
+    [(True, {}, True), (False, {}, True), (False, {"compression": "gzip"}, False)],
+    ids=["per-row", "batch", "gzip-fallback"],
+)
+@pytest.mark.parametrize("start,stop,step", [(0, LENGTH, 1), (3, LENGTH - 2, 2), (5, 30, 3), (10, 10, 1)])
+def test_packed_frames_match_h5py(tmp_path, per_row, kwargs, direct, start, stop, step):
+    frames = random_frames(np.random.default_rng(0))
+    path = tmp_path / "frames.hdf5"
+    with h5py.File(path, "w") as f:
+        write_camera(f, frames, per_row, **kwargs)
+
+    with h5py.File(path, "r") as f:
+        ds = f["image_left"]
+        assert is_direct_vlen_readable(ds) == direct
+        packed = read_vlen_frames(ds, start, stop, step)
+        expected = frames[start:stop:step]
+        assert len(packed) == len(expected)
+        assert packed.nbytes == sum(len(frame) for frame in expected)
+        for view, frame in zip(packed, expected):
+            assert isinstance(view, memoryview)
+            assert bytes(view) == frame.tobytes()
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"compression": "gzip"}], ids=["direct", "gzip-fallback"])
+def test_episode_storage_size_counts_jpeg_bytes(tmp_path, kwargs):
+    rng = np.random.default_rng(1)
+    frames = random_frames(rng)
+    action = rng.random((LENGTH, 14), dtype=np.float32)
+    with h5py.File(tmp_path / "episode.hdf5", "w") as f:
+        group = f.create_group("episode_0")
+        group["action"] = action
+        write_camera(group, frames, per_row=True, **kwargs)
+
+    with h5py.File(tmp_path / "episode.hdf5", "r") as f:
+        assert episode_storage_size(f["episode_0"]) == action.nbytes + sum(len(frame) for frame in frames)
@@ -0,0 +1,57 @@
+"""
+动态调度：重建队列前检查已完成的 rank，避免同一 episode 被转换进多个 shard
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("datatrove")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "convert_parallel"))
+import convert_hdf5_shards  # noqa: E402
+from convert_hdf5_shards import EpisodeWorkQueue, make_convert_executor  # noqa: E402
+
+
+EPISODE_COSTS = {("a.hdf5", "episode_0"): 30, ("a.hdf5", "episode_1"): 10, ("b.hdf5", "episode_0"): 20}
+
+
+def make_dynamic_executor(logs_dir: Path, resume: bool):
+    return make_convert_executor(
+        hdf5_files=["a.hdf5", "b.hdf5"],
+        repo_id="test/queue",
+        robot_type="bi_piper",
+        fps=30,
+        job_name="job",
+        logs_dir=logs_dir,
+        workers=2,
+        partition=None,
+        cpus_per_task=1,
+        mem_per_cpu=None,
+        episode_costs=EPISODE_COSTS,
+        schedule="dynamic",
+        resume=resume,
+        slurm=False,
+    )
+
+
+@pytest.fixture(autouse=True)
+def lerobot_home(tmp_path, monkeypatch):
+    monkeypatch.setattr(convert_hdf5_shards, "HF_LEROBOT_HOME", tmp_path / "lerobot")
+
+
+def test_queue_hands_out_longest_episodes_first(tmp_path):
+    make_dynamic_executor(tmp_path, resume=False)
+    episodes = list(EpisodeWorkQueue(str(tmp_path / "job" / "work_queue")))
+    assert episodes == [("a.hdf5", "episode_0"), ("b.hdf5", "episode_0"), ("a.hdf5", "episode_1")]
+
+
+def test_rerun_with_completed_ranks_requires_resume(tmp_path):
+    completions = tmp_path / "job" / "completions"
+    completions.mkdir(parents=True)
+    (completions / "00000").touch()
+
+    with pytest.raises(ValueError, match="--resume"):
+        make_dynamic_executor(tmp_path, resume=False)
+    make_dynamic_executor(tmp_path, resume=True)